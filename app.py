@@ -1,51 +1,371 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, has_request_context, g, Response, abort
+from flask import stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask import send_from_directory
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import openai
-from PyPDF2 import PdfReader
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import difflib  # Для сравнения текстов
-import re  # Для поиска дат
-from datetime import datetime
-from flask_migrate import Migrate
+import hashlib
+import cProfile
+import pstats
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import json
+import click
+import word_diff  # Для сравнения текстов
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, deferred, load_only, selectinload
+from flask_migrate import upgrade
+from config import Config, sqlite_pragmas
+import sqlite3
+from text_cache import TextCache, file_sha256
+from jobs import JobQueue
+import pdf_extract
+import tfidf_index
+import minhash
+import summarizer
+import search
+import date_extract  # Для поиска дат
+from singleflight import SingleFlight
+import metrics
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-
-# Пути к директориям uploads и summaries
-base_dir = os.path.abspath(os.path.dirname(__file__))
-app.config['UPLOAD_FOLDER'] = os.path.join(base_dir, 'uploads/')
-app.config['SUMMARY_FOLDER'] = os.path.join(base_dir, 'summaries/')
+# База данных, секретный ключ и пути к директориям uploads, summaries и cache задаются
+# переменными окружения (DATABASE_URL, SECRET_KEY, UPLOAD_FOLDER, ...), см. config.py
+app.config.from_object(Config)
+
+# Кэш извлечённого из PDF текста (ключ — SHA-256 файла и версия PyPDF2)
+app.config['TEXT_CACHE_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'text/')
+app.config['TEXT_CACHE_MAX_BYTES'] = int(os.getenv('TEXT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Фоновые задачи: число процессов `flask worker` и выполнение прямо в запросе для отладки
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+app.config['JOBS_INLINE'] = os.getenv('JOBS_INLINE', '0') == '1'
+# Параллельное извлечение текста: число процессов и минимальный размер документа для пула
+app.config['PDF_EXTRACT_WORKERS'] = int(os.getenv('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+app.config['PDF_PARALLEL_MIN_PAGES'] = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 32))
+# Потоковое сохранение страниц: фиксация транзакции каждые N страниц
+app.config['INGEST_COMMIT_PAGES'] = int(os.getenv('INGEST_COMMIT_PAGES', 20))
+# Индекс TF-IDF по всему корпусу: файл словаря и доля изменений корпуса, после которой он переобучается
+app.config['TFIDF_INDEX_PATH'] = os.path.join(app.config['CACHE_FOLDER'], 'tfidf/index.pkl')
+app.config['TFIDF_REFIT_FRACTION'] = float(os.getenv('TFIDF_REFIT_FRACTION', 0.1))
+# Поиск похожих документов: размер корпуса, с которого кандидаты отбираются через MinHash/LSH
+app.config['SIMILAR_LSH_MIN_DOCUMENTS'] = int(os.getenv('SIMILAR_LSH_MIN_DOCUMENTS', 5000))
+app.config['SIMILAR_MAX_K'] = 100
+# Размер страницы реестра документов
+app.config['REGISTRY_PAGE_SIZE'] = 50
+app.config['REGISTRY_MAX_PAGE_SIZE'] = 500
+# Полнотекстовый поиск (SQLite FTS5): результатов на странице и вес совпадений в названии
+app.config['SEARCH_PAGE_SIZE'] = 20
+app.config['SEARCH_TITLE_WEIGHT'] = 10.0
+# Пакетный анализ: документов в одной задаче (и в одной транзакции) и потоков для извлечения текста
+app.config['ANALYZE_BATCH_CHUNK'] = int(os.getenv('ANALYZE_BATCH_CHUNK', 20))
+app.config['ANALYZE_BATCH_EXTRACT_THREADS'] = int(os.getenv('ANALYZE_BATCH_EXTRACT_THREADS', 4))
+# Как часто задача пакета отмечает прогресс, пока идёт анализ (должно быть намного меньше stale_after очереди)
+app.config['ANALYZE_BATCH_HEARTBEAT_SECONDS'] = int(os.getenv('ANALYZE_BATCH_HEARTBEAT_SECONDS', 60))
+# Синхронизация с папкой uploads: число документов, записываемых в базу за одну транзакцию
+app.config['SYNC_BATCH_SIZE'] = int(os.getenv('SYNC_BATCH_SIZE', 500))
+# Почти-дубликаты: оценка сходства Жаккара по шинглам, начиная с которой документ помечается
+app.config['NEAR_DUPLICATE_THRESHOLD'] = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', 0.7))
+app.config['SHINGLE_SIZE'] = 5
+# Сравнение текстов: участки длиннее стольких слов сначала делятся по редким словам
+app.config['DIFF_CUTOFF'] = int(os.getenv('DIFF_CUTOFF', 2000))
+# Сравнение показывается выровненными фрагментами: слов во фрагменте и фрагментов в первой порции
+app.config['COMPARE_HUNK_TOKENS'] = int(os.getenv('COMPARE_HUNK_TOKENS', 300))
+app.config['COMPARE_HUNKS_PER_PAGE'] = int(os.getenv('COMPARE_HUNKS_PER_PAGE', 40))
+# Текст страницы документа отдаётся частями примерно по столько символов
+app.config['VIEW_TEXT_CHUNK_CHARS'] = 64 * 1024
+# Кэш результатов сравнения: время жизни записи в секундах и наибольшее число записей
+app.config['COMPARISON_CACHE_TTL'] = int(os.getenv('COMPARISON_CACHE_TTL', 24 * 60 * 60))
+app.config['COMPARISON_CACHE_MAX_ROWS'] = int(os.getenv('COMPARISON_CACHE_MAX_ROWS', 10000))
+# Резюме длинных документов: модель, размер части в токенах, параллельность и лимит запросов
+app.config['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY', 'your_secrer_key')
+app.config['SUMMARY_MODEL'] = os.getenv('SUMMARY_MODEL', 'gpt-3.5-turbo')
+app.config['SUMMARY_CHUNK_TOKENS'] = int(os.getenv('SUMMARY_CHUNK_TOKENS', 3000))
+app.config['SUMMARY_CONCURRENCY'] = int(os.getenv('SUMMARY_CONCURRENCY', 4))
+app.config['SUMMARY_REQUESTS_PER_MINUTE'] = int(os.getenv('SUMMARY_REQUESTS_PER_MINUTE', 60))
+app.config['SUMMARY_CHUNK_CACHE_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'summary_chunks/')
+app.config['SUMMARY_CHUNK_CACHE_MAX_BYTES'] = int(os.getenv('SUMMARY_CHUNK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Готовые резюме документов (ключ — хэш содержимого, модель и версия промпта) и копии в папке summaries
+app.config['SUMMARY_STORE_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'summaries/')
+app.config['SUMMARY_STORE_MAX_BYTES'] = int(os.getenv('SUMMARY_STORE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['SUMMARY_PERSIST_FILES'] = os.getenv('SUMMARY_PERSIST_FILES', '0') == '1'
+# Метрики Prometheus (/metrics): значения процессов собираются через файлы в METRICS_FOLDER.
+# Если задан METRICS_TOKEN, /metrics требует заголовок Authorization: Bearer <токен>.
+app.config['METRICS_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'metrics/')
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# Профилирование отдельных запросов (заголовок X-Profile: 1 или параметр ?profile=1);
+# отчёты cProfile (.prof и текстовая сводка .txt) сохраняются в PROFILE_FOLDER
+app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', '0') == '1'
+app.config['PROFILE_FOLDER'] = os.getenv('PROFILE_FOLDER', os.path.join(app.config['CACHE_FOLDER'], 'profiles/'))
+
+# Версия алгоритма сравнения: при изменении подсветки или схожести старые результаты не используются
+COMPARISON_ALGORITHM_VERSION = 'word_diff-1'
 
 db = SQLAlchemy(app)  # Инициализация базы данных
-migrate = Migrate(app, db)
+
+# Настройки каждого нового соединения с SQLite: режим WAL, ожидание блокировок, кэш страниц
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+# Таблицы полнотекстового индекса создаются миграцией вручную, autogenerate их не трогает
+def include_in_migrations(object, name, type_, reflected, compare_to):
+    return not (type_ == 'table' and name.startswith(search.TABLE))
+
+migrate = Migrate(app, db, include_object=include_in_migrations)
+
+# Время фиксации транзакций (вместе с отправкой изменений в базу) для метрики db_commit
+@event.listens_for(Session, 'before_commit')
+def start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+@event.listens_for(Session, 'after_commit')
+def stop_commit_timer(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, 'db_commit')
+
+@event.listens_for(Session, 'after_rollback')
+def drop_commit_timer(session):
+    session.info.pop('commit_started', None)
+
+metrics.registry.configure(app.config['METRICS_FOLDER'])
+
+# Время запроса для гистограммы по маршрутам и, по запросу, профилирование
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    wants_profile = request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+    if app.config['PROFILING_ENABLED'] and wants_profile and current_user.is_authenticated:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        response.headers['X-Profile-Report'] = save_profile(profiler)
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started, request.method, request.endpoint or 'unknown', str(response.status_code)
+        )
+    return response
+
+# Отчёт профилировщика: <время>-<маршрут>-<pid>.prof для snakeviz/pstats и текстовая сводка рядом
+def save_profile(profiler):
+    os.makedirs(app.config['PROFILE_FOLDER'], exist_ok=True)
+    name = f'{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{request.endpoint or "unknown"}-{os.getpid()}'
+    path = os.path.join(app.config['PROFILE_FOLDER'], name)
+    profiler.dump_stats(path + '.prof')
+    with open(path + '.txt', 'w', encoding='utf-8') as file:
+        file.write(f'{request.method} {request.full_path}\n\n')
+        pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(50)
+    return name
+
+# Метрики в формате Prometheus
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # Инициализация LoginManager
 login_manager = LoginManager()
 login_manager.init_app(app)  # Привязываем его к приложению Flask
 login_manager.login_view = 'login'  # Указываем маршрут для страницы логина
 
-openai.api_key = os.getenv('OPENAI_API_KEY', 'your_secrer_key')
+
+text_cache = TextCache(app.config['TEXT_CACHE_FOLDER'], app.config['TEXT_CACHE_MAX_BYTES'])
+corpus_index = tfidf_index.CorpusIndex(app.config['TFIDF_INDEX_PATH'])
+shingle_hasher = minhash.MinHasher()
+document_summarizer = summarizer.Summarizer(
+    summarizer.openai_completion(app.config['SUMMARY_MODEL'], api_key=app.config['OPENAI_API_KEY']),
+    model=app.config['SUMMARY_MODEL'],
+    cache=TextCache(app.config['SUMMARY_CHUNK_CACHE_FOLDER'], app.config['SUMMARY_CHUNK_CACHE_MAX_BYTES']),
+    max_chunk_tokens=app.config['SUMMARY_CHUNK_TOKENS'],
+    concurrency=app.config['SUMMARY_CONCURRENCY'],
+    requests_per_minute=app.config['SUMMARY_REQUESTS_PER_MINUTE'],
+)
+summary_store = TextCache(app.config['SUMMARY_STORE_FOLDER'], app.config['SUMMARY_STORE_MAX_BYTES'])
+summary_flight = SingleFlight(os.path.join(app.config['SUMMARY_STORE_FOLDER'], 'locks'))
 
 # Таблица для хранения данных о документах
 class Document(db.Model):
     __tablename__ = 'document'
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(150), nullable=False)
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    content = db.Column(db.Text, nullable=False)  # Текст документа
+    title = db.Column(db.String(150), nullable=False, index=True)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     summary = db.Column(db.Text, nullable=True)  # Сгенерированное резюме
-    filename = db.Column(db.String(150), nullable=False)  # Имя файла
+    has_summary = db.column_property(summary.isnot(None))  # Для реестра: само резюме не загружается
+    filename = db.Column(db.String(150), nullable=False, index=True)  # Имя файла
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    similarity = db.Column(db.Float, nullable=True)  # Процент схожести
+    similarity = db.Column(db.Float, nullable=True)  # Наибольший процент схожести с другим документом корпуса
     dates = db.Column(db.Text, nullable=True)  # Найденные даты
+    page_count = db.Column(db.Integer, nullable=False, default=0)  # Число сохранённых страниц
+    # Текст хранится в document_page, а двоичные данные загружаются только при обращении к ним,
+    # чтобы строки документов, которые читает каждый запрос, оставались небольшими
+    tfidf_vector = deferred(db.Column(db.LargeBinary, nullable=True))  # Разреженный TF-IDF вектор (индексы и веса)
+    tfidf_version = db.Column(db.Integer, nullable=True)  # Версия индекса, по которой посчитан вектор
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 файла
+    file_size = db.Column(db.BigInteger, nullable=True)  # Размер и время изменения файла при последней синхронизации
+    file_mtime = db.Column(db.Float, nullable=True)
+    minhash = deferred(db.Column(db.LargeBinary, nullable=True))  # MinHash-сигнатура шинглов текста
+    minhash_seq = db.Column(db.Integer, nullable=True, index=True)  # Номер последней записи minhash, растёт монотонно
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='SET NULL'), nullable=True)  # Точная копия
+    near_duplicate_of_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='SET NULL'), nullable=True)
+    near_duplicate_score = db.Column(db.Float, nullable=True)  # Оценка сходства Жаккара с почти-копией
+    duplicate_of = db.relationship('Document', remote_side=[id], foreign_keys=[duplicate_of_id])
+    near_duplicate_of = db.relationship('Document', remote_side=[id], foreign_keys=[near_duplicate_of_id])
+    jobs = db.relationship('Job', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    found_dates = db.relationship('DocumentDate', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                                  order_by='DocumentDate.id')
+    pages = db.relationship('DocumentPage', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                            order_by='DocumentPage.page_number')
+
+
+# Текст документа по страницам: пишется при загрузке и читается постранично
+class DocumentPage(db.Model):
+    __tablename__ = 'document_page'
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)  # Номер страницы, начиная с 1
+    content = db.Column(db.Text, nullable=False)
+    __table_args__ = (db.UniqueConstraint('document_id', 'page_number'),)
+
+
+# Даты, найденные в тексте документа: одна строка на каждое упоминание
+class DocumentDate(db.Model):
+    __tablename__ = 'document_date'
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)  # Для неполных дат — первый день месяца или года
+    precision = db.Column(db.String(5), nullable=False)  # day, month или year
+    page_number = db.Column(db.Integer, nullable=False)
+    offset = db.Column(db.Integer, nullable=False)  # Позиция упоминания на странице
+    text = db.Column(db.String(50), nullable=False)  # Дата в том виде, как она записана в тексте
+    # Запросы по диапазону дат читают только индекс: дата и документ в одном B-дереве
+    __table_args__ = (db.Index('ix_document_date_date_document', 'date', 'document_id'),)
+
+
+# Кэш результатов сравнения страницы двух документов. Ключ — хэши содержимого,
+# поэтому результат переиспользуется и для копий файлов под другими именами.
+class Comparison(db.Model):
+    __tablename__ = 'comparison'
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash1 = db.Column(db.String(64), nullable=False)
+    content_hash2 = db.Column(db.String(64), nullable=False, index=True)
+    page_number = db.Column(db.Integer, nullable=False)
+    algorithm_version = db.Column(db.String(50), nullable=False)
+    similarity = db.Column(db.Float, nullable=False)  # Процент схожести документов целиком
+    opcodes = db.Column(db.LargeBinary, nullable=False)  # Упакованные опкоды сравнения страницы
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    __table_args__ = (db.UniqueConstraint('content_hash1', 'content_hash2', 'page_number', 'algorithm_version'),)
+
+
+# Таблица очереди фоновых задач (извлечение текста, анализ)
+class Job(db.Model):
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Тип задачи: ingest, analyze, analyze_batch
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Прогресс в процентах
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Число сделанных попыток
+    max_attempts = db.Column(db.Integer, nullable=False, default=lambda: app.config['JOB_MAX_ATTEMPTS'])
+    error = db.Column(db.Text, nullable=True)  # Текст последней ошибки
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Не запускать раньше
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payload = db.Column(db.Text, nullable=True)  # Параметры задачи в JSON (например, список документов)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'document_id': self.document_id,
+            'status': self.status,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+        }
+
 
+job_queue = JobQueue(db, Job)
+
+
+# Пакетный анализ множества документов и его ход по каждому документу
+class AnalysisBatch(db.Model):
+    __tablename__ = 'analysis_batch'
+    id = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=True)  # Как выбраны документы (id или фильтр)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    items = db.relationship('AnalysisBatchItem', backref='batch', lazy='dynamic', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'description': self.description,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'pending': self.total - self.done - self.failed,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class AnalysisBatchItem(db.Model):
+    __tablename__ = 'analysis_batch_item'
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('analysis_batch.id', ondelete='CASCADE'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, failed
+    error = db.Column(db.Text, nullable=True)
+    # Время этапов в секундах: извлечение текста, резюме, поиск дат
+    extract_seconds = db.Column(db.Float, nullable=True)
+    summary_seconds = db.Column(db.Float, nullable=True)
+    dates_seconds = db.Column(db.Float, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.Index('ix_analysis_batch_item_batch_status', 'batch_id', 'status'),)
+
+    def to_dict(self):
+        return {
+            'document_id': self.document_id,
+            'status': self.status,
+            'error': self.error,
+            'extract_seconds': self.extract_seconds,
+            'summary_seconds': self.summary_seconds,
+            'dates_seconds': self.dates_seconds,
+        }
+
+# Подписи состояний задач для реестра документов
+JOB_STATUS_LABELS = {
+    'pending': 'В очереди',
+    'running': 'Выполняется',
+    'done': 'Готово',
+    'failed': 'Ошибка',
+}
 
 
 # Модель для пользователей
@@ -58,10 +378,19 @@ class User(UserMixin, db.Model):
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Инициализация базы данных при запуске приложения
-with app.app_context():
-    db.drop_all() 
-    db.create_all()  # Создание всех таблиц при запуске
+# Схема базы данных создаётся и обновляется миграциями: flask --app app db upgrade
+
+# Тяжёлые библиотеки (sklearn, scipy, PyPDF2, openai) импортируются при первом
+# использовании. При запуске gunicorn с --preload мастер-процесс вызывает warmup()
+# до создания воркеров, и воркеры получают уже загруженные модули через fork.
+def warmup():
+    import openai  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import scipy.sparse  # noqa: F401
+    import sklearn.feature_extraction.text  # noqa: F401
+    import sklearn.metrics.pairwise  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    corpus_index.refresh()
 
 # Маршруты приложения (анализ документов, сравнение, загрузка файлов и т.д.)
 @app.route('/')
@@ -81,8 +410,8 @@ def generate_summary(document_id):
 
     # Генерация резюме для документа
     try:
-        text = extract_text_from_pdf(os.path.join(app.config['UPLOAD_FOLDER'], document.filename))
-        document.summary = generate_summary_with_openai(text)
+        document.summary = summarize_document(document)
+        update_search_index(document)
         db.session.commit()
         flash(f'Резюме успешно создано для документа {document.filename}.')
     except Exception as e:
@@ -94,34 +423,225 @@ def generate_summary(document_id):
 @login_required
 def view_document(document_id):
     document = Document.query.get_or_404(document_id)
-    return render_template('view_document.html', document=document)
+    page = request.args.get('page', 1, type=int)
+    text, page_count = get_page_text(document, page)
+    size = app.config['VIEW_TEXT_CHUNK_CHARS']
+    text_parts = (text[start:start + size] for start in range(0, len(text), size))
+    return stream_page('view_document.html', document=document, text_parts=text_parts, page=page, page_count=page_count)
+
+# Потоковая отрисовка шаблона: HTML уходит клиенту по частям, пока шаблон выполняется,
+# и страница целиком в памяти не собирается
+def stream_page(template_name, **context):
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(20)
+    return Response(stream_with_context(stream))
+
+# Похожие документы: /documents/<id>/similar?k=10
+@app.route('/documents/<int:document_id>/similar')
+@login_required
+def similar_documents(document_id):
+    document = Document.query.get_or_404(document_id)
+    k = max(1, min(request.args.get('k', 10, type=int), app.config['SIMILAR_MAX_K']))
+    similar = find_similar_documents(document, k)
+    if similar is None:
+        flash('Документ ещё не проиндексирован, попробуйте позже.')
+        return redirect(url_for('document_registry'))
+    return render_template('similar_documents.html', document=document, similar=similar, k=k)
 
-@app.route('/compare_selected_documents', methods=['POST'])
+@app.route('/api/documents/<int:document_id>/similar')
+@login_required
+def similar_documents_api(document_id):
+    document = Document.query.get_or_404(document_id)
+    k = max(1, min(request.args.get('k', 10, type=int), app.config['SIMILAR_MAX_K']))
+    similar = find_similar_documents(document, k)
+    if similar is None:
+        return jsonify({'error': 'Документ ещё не проиндексирован.'}), 409
+    return jsonify({
+        'document_id': document.id,
+        'results': [
+            {'id': doc.id, 'title': doc.title, 'filename': doc.filename, 'similarity': score}
+            for doc, score in similar
+        ],
+    })
+
+@app.route('/compare_selected_documents', methods=['GET', 'POST'])
 @login_required
 def compare_selected_documents():
-    # Получаем имена выбранных файлов из формы
-    file1 = request.form['document1']
-    file2 = request.form['document2']
+    # Получаем имена выбранных файлов из формы (или из ссылки на другую страницу сравнения)
+    file1 = request.values['document1']
+    file2 = request.values['document2']
+    page = request.args.get('page', 1, type=int)
 
-    # Извлечение текста из выбранных файлов
-    text1 = extract_text_from_pdf(os.path.join(app.config['UPLOAD_FOLDER'], file1))
-    text2 = extract_text_from_pdf(os.path.join(app.config['UPLOAD_FOLDER'], file2))
+    # Отправляем результат на страницу сравнения
+    return stream_comparison(
+        document_for_file(file1), document_for_file(file2), page, page_args={'document1': file1, 'document2': file2}
+    )
 
-    # Вычисление процента схожести
-    similarity_percentage = calculate_similarity(text1, text2)
+# Страница сравнения отдаётся потоком: заголовок уходит сразу, затем первые фрагменты
+# сравнения по мере подсветки; остальные фрагменты страница догружает через /api/compare/hunks.
+# Сравнение (чтение страниц, запросы к базе, поиск отличий) выполняется до ответа: после
+# after_request в потоке остаётся только подсветка, и время запроса в метриках полное
+def stream_comparison(document1, document2, page, **context):
+    diff = page_diff(document1, document2, page)
+    page_hunks = word_diff.split_hunks(diff['opcodes'], app.config['COMPARE_HUNK_TOKENS'])
+    comparison = {'similarity': diff['similarity'], 'page_count': diff['page_count'], 'total_hunks': len(page_hunks)}
+
+    def hunks():
+        for hunk in page_hunks[:app.config['COMPARE_HUNKS_PER_PAGE']]:
+            with metrics.stage('diff'):
+                rendered = word_diff.render_hunk(diff['tokens1'], diff['tokens2'], hunk)
+            yield rendered
+
+    return stream_page(
+        'compare_files.html', file1=document1.filename, file2=document2.filename, page=page, hunks=hunks(),
+        comparison=comparison,
+        hunks_per_page=app.config['COMPARE_HUNKS_PER_PAGE'], **context
+    )
 
-    # Подсветка общих слов
-    highlighted_text1, highlighted_text2 = highlight_common_words(text1, text2)
+# Фрагменты сравнения страницы по запросу: /api/compare/hunks?file1=..&file2=..&page=1&offset=40&limit=40
+@app.route('/api/compare/hunks')
+@login_required
+def compare_hunks_api():
+    file1 = request.args.get('file1')
+    file2 = request.args.get('file2')
+    if not file1 or not file2:
+        return jsonify({'error': 'Не указаны файлы для сравнения.'}), 400
+    page = request.args.get('page', 1, type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', app.config['COMPARE_HUNKS_PER_PAGE'], type=int), 1), 200)
+
+    diff = page_diff(document_for_file(file1), document_for_file(file2), page)
+    page_hunks = word_diff.split_hunks(diff['opcodes'], app.config['COMPARE_HUNK_TOKENS'])
+    with metrics.stage('diff'):
+        rendered = [
+            {'index': index, **word_diff.render_hunk(diff['tokens1'], diff['tokens2'], hunk)}
+            for index, hunk in enumerate(page_hunks[offset:offset + limit], start=offset)
+        ]
+    next_offset = offset + len(rendered)
+    return jsonify({
+        'file1': file1,
+        'file2': file2,
+        'page': page,
+        'page_count': diff['page_count'],
+        'similarity': diff['similarity'],
+        'total': len(page_hunks),
+        'hunks': rendered,
+        'next_offset': next_offset if next_offset < len(page_hunks) else None,
+    })
+
+# Документ для имени файла из запроса: последний загруженный с таким именем (имена не
+# уникальны). Для файла, который лежит в uploads, но не зарегистрирован, — несохранённая
+# запись: его текст берётся из самого файла. Если нет ни записи, ни файла — 404.
+def document_for_file(filename):
+    document = Document.query.filter_by(filename=filename).order_by(Document.id.desc()).first()
+    if document is None:
+        if not os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+            abort(404)
+        document = Document(title=filename, filename=filename, page_count=0)
+    return document
+
+# Сравнение двух документов: процент схожести по всему тексту и опкоды одной страницы
+def page_diff(document1, document2, page):
+    text1, page_count1 = get_page_text(document1, page)
+    text2, page_count2 = get_page_text(document2, page)
+    with metrics.stage('diff'):
+        tokens1 = word_diff.tokenize(text1)
+        tokens2 = word_diff.tokenize(text2)
+
+    # Схожесть и опкоды берём из кэша, HTML каждый раз строится заново по опкодам. Пока текст
+    # документа не разбит на страницы, «страница 1» — это весь файл, поэтому такие сравнения
+    # не кэшируются: ключ (хэши, номер страницы) совпал бы с настоящей первой страницей
+    paginated = bool(document1.page_count and document2.page_count)
+    hash1 = get_content_hash(document1) if paginated else None
+    hash2 = get_content_hash(document2) if paginated else None
+    cached = load_comparison(hash1, hash2, page)
+    if cached is not None:
+        similarity_percentage, opcodes = cached
+    else:
+        similarity_percentage = document_similarity(document1, document2)
+        with metrics.stage('diff'):
+            opcodes = word_diff.diff_opcodes(tokens1, tokens2, cutoff=app.config['DIFF_CUTOFF'])
+        store_comparison(hash1, hash2, page, similarity_percentage, opcodes)
+
+    return {
+        'tokens1': tokens1,
+        'tokens2': tokens2,
+        'opcodes': opcodes,
+        'similarity': similarity_percentage,
+        'page_count': max(page_count1, page_count2),
+    }
+
+
+# SHA-256 файла документа: из записи или, если он ещё не посчитан, по самому файлу
+def get_content_hash(document):
+    if document.content_hash:
+        return document.content_hash
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], document.filename)
+    if not os.path.exists(file_path):
+        return None
+    content_hash = file_sha256(file_path)
+    if document.id is not None:
+        document.content_hash = content_hash
+        db.session.commit()
+    return content_hash
+
+def comparison_version():
+    return f'{COMPARISON_ALGORITHM_VERSION}:tfidf-{corpus_index.refresh().version}'
+
+# Пара хэшей хранится в одном порядке; для обратного порядка опкоды разворачиваются
+def load_comparison(hash1, hash2, page):
+    if not hash1 or not hash2:
+        return None
+    swapped = hash1 > hash2
+    if swapped:
+        hash1, hash2 = hash2, hash1
+    comparison = Comparison.query.filter_by(
+        content_hash1=hash1, content_hash2=hash2, page_number=page, algorithm_version=comparison_version()
+    ).first()
+    if comparison is None:
+        return None
+    if comparison.last_used_at < datetime.utcnow() - timedelta(seconds=app.config['COMPARISON_CACHE_TTL']):
+        return None  # Устаревшая запись будет перезаписана и удалена при очистке
+    comparison.last_used_at = datetime.utcnow()
+    db.session.commit()
+    opcodes = word_diff.unpack_opcodes(comparison.opcodes)
+    return comparison.similarity, word_diff.invert_opcodes(opcodes) if swapped else opcodes
+
+def store_comparison(hash1, hash2, page, similarity, opcodes):
+    if not hash1 or not hash2:
+        return
+    if hash1 > hash2:
+        hash1, hash2 = hash2, hash1
+        opcodes = word_diff.invert_opcodes(opcodes)
+    key = dict(content_hash1=hash1, content_hash2=hash2, page_number=page, algorithm_version=comparison_version())
+    Comparison.query.filter_by(**key).delete()
+    db.session.add(Comparison(similarity=similarity, opcodes=word_diff.pack_opcodes(opcodes), **key))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # Ту же пару одновременно сохранил другой процесс
+        return
+    evict_comparisons()
+
+# Удаление записей с истёкшим сроком и самых давно использованных сверх лимита
+def evict_comparisons():
+    expired_before = datetime.utcnow() - timedelta(seconds=app.config['COMPARISON_CACHE_TTL'])
+    Comparison.query.filter(Comparison.last_used_at < expired_before).delete()
+    overflow = Comparison.query.count() - app.config['COMPARISON_CACHE_MAX_ROWS']
+    if overflow > 0:
+        oldest = db.session.query(Comparison.id).order_by(Comparison.last_used_at).limit(overflow)
+        Comparison.query.filter(Comparison.id.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+    db.session.commit()
 
-    # Отправляем результат на страницу сравнения
-    return render_template(
-        'compare_files.html',
-        file1=file1,
-        file2=file2,
-        text1=highlighted_text1,
-        text2=highlighted_text2,
-        similarity=similarity_percentage
-    )
+# Сброс кэша сравнений для содержимого, которого больше нет ни в одном документе
+def invalidate_comparisons(content_hash):
+    if not content_hash or Document.query.filter_by(content_hash=content_hash).first():
+        return
+    Comparison.query.filter(
+        db.or_(Comparison.content_hash1 == content_hash, Comparison.content_hash2 == content_hash)
+    ).delete(synchronize_session=False)
+    db.session.commit()
 
 
 @app.route('/delete_document/<int:document_id>', methods=['POST'])
@@ -134,9 +654,18 @@ def delete_document(document_id):
         if os.path.exists(file_path):
             os.remove(file_path)
         
-        # Удаление записи из базы данных
+        # Удаление записи из базы данных, копии перестают ссылаться на документ
+        Document.query.filter_by(duplicate_of_id=document.id).update({'duplicate_of_id': None})
+        Document.query.filter_by(near_duplicate_of_id=document.id).update(
+            {'near_duplicate_of_id': None, 'near_duplicate_score': None}
+        )
+        if search.is_supported(db.session):
+            search.remove_document(db.session, document.id)
+        forget_similarities([document.id])
         db.session.delete(document)
         db.session.commit()
+        invalidate_comparisons(document.content_hash)
+        schedule_tfidf_refit()
         flash(f'Документ {document.filename} успешно удален.')
     except Exception as e:
         flash(f'Ошибка при удалении документа: {e}')
@@ -144,159 +673,943 @@ def delete_document(document_id):
     return redirect(url_for('document_registry'))
 
 
+# Обновление полнотекстового индекса документа; транзакцию фиксирует вызывающий код
+def update_search_index(document):
+    db.session.flush()  # Индекс заполняется из таблиц, поэтому изменения должны быть в базе
+    update_search_index_by_id(document.id)
+
+def update_search_index_by_id(document_id):
+    if search.is_supported(db.session):
+        search.index_document(db.session, document_id)
+
+# Полнотекстовый поиск по названиям, тексту страниц и резюме
+@app.route('/search')
+@login_required
+def search_documents():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_PAGE_SIZE']
+    if not search.is_supported(db.session):
+        flash('Полнотекстовый поиск доступен только для базы данных SQLite.')
+        return redirect(url_for('document_registry'))
+    results, total = run_search(query, per_page, (page - 1) * per_page)
+    pages = (total + per_page - 1) // per_page
+    return render_template('search.html', query=query, results=results, total=total, page=page, pages=pages)
+
+@app.route('/api/search')
+@login_required
+def search_api():
+    if not search.is_supported(db.session):
+        return jsonify({'error': 'Полнотекстовый поиск доступен только для базы данных SQLite.'}), 501
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int), app.config['REGISTRY_MAX_PAGE_SIZE']))
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    results, total = run_search(query, limit, offset)
+    return jsonify({
+        'query': query,
+        'total': total,
+        'results': [
+            {
+                'id': result['document'].id,
+                'title': result['document'].title,
+                'filename': result['document'].filename,
+                'page': result['page_number'] or None,  # 0 — совпадение в названии или резюме
+                'score': result['score'],
+                'snippet': result['snippet'],
+            }
+            for result in results
+        ],
+    })
+
+# Результаты поиска вместе с документами (без текста и резюме)
+def run_search(query, limit, offset):
+    results, total = search.search(
+        db.session, query, limit=limit, offset=offset, title_weight=app.config['SEARCH_TITLE_WEIGHT']
+    )
+    ids = [result['document_id'] for result in results]
+    documents = {
+        document.id: document
+        for document in Document.query.options(load_only(Document.id, Document.title, Document.filename)).filter(Document.id.in_(ids))
+    } if ids else {}
+    found = []
+    for result in results:
+        document = documents.get(result['document_id'])
+        if document is not None:
+            found.append(dict(result, document=document))
+    return found, total
+
 # Функция для выделения общих слов
+@metrics.stage('diff')
 def highlight_common_words(text1, text2):
-    matcher = difflib.SequenceMatcher(None, text1.split(), text2.split())
-    result1 = []
-    result2 = []
-    
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        if tag == 'equal': 
-            result1.append(f"<span class='highlight'>{' '.join(text1.split()[i1:i2])}</span>")
-            result2.append(f"<span class='highlight'>{' '.join(text2.split()[j1:j2])}</span>")
-        else:
-            result1.append(' '.join(text1.split()[i1:i2]))
-            result2.append(' '.join(text2.split()[j1:j2]))
-    
-    return ' '.join(result1), ' '.join(result2)
+    # Тексты разбиваются на слова один раз, дальше работаем с опкодами
+    tokens1 = word_diff.tokenize(text1)
+    tokens2 = word_diff.tokenize(text2)
+    opcodes = word_diff.diff_opcodes(tokens1, tokens2, cutoff=app.config['DIFF_CUTOFF'])
+    return word_diff.highlight(tokens1, tokens2, opcodes)
 
 # Функция для вычисления процента схожести
+@metrics.stage('tfidf')
 def calculate_similarity(text1, text2):
+    if corpus_index.fitted:
+        # IDF берётся по всему корпусу, поэтому проценты сравнимы между разными парами
+        vector1 = corpus_index.transform([text1])
+        vector2 = corpus_index.transform([text2])
+        return tfidf_index.cosine(vector1, vector2) * 100
+
+    # Корпус ещё не проиндексирован: обучаемся только на двух текстах
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
     vectorizer = TfidfVectorizer()
     tfidf_matrix = vectorizer.fit_transform([text1, text2])
     similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
     similarity_percentage = similarity_matrix[0][0] * 100
     return similarity_percentage
 
-# Функция для поиска дат в тексте
-def find_dates_in_text(text):
-    date_pattern = r'\b(?:\d{1,2}[./-])?(?:\d{1,2}[./-])?(?:\d{2,4})\b'
-    dates = re.findall(date_pattern, text)
-    return dates
-
-# Функция для фильтрации и форматирования дат
-def filter_and_format_dates(dates):
-    valid_dates = []
-    for date_str in dates:
-        for fmt in ('%d-%m-%Y', '%d.%m.%Y', '%Y', '%m-%Y', '%Y-%m-%d'):
-            try:
-                parsed_date = datetime.strptime(date_str, fmt)
-                valid_dates.append(parsed_date)
-                break
-            except ValueError:
-                continue
-    return valid_dates
+# Схожесть двух загруженных файлов: по сохранённым векторам, если они актуальны
+def document_similarity(document1, document2):
+    if (corpus_index.fitted and document1.id is not None and document2.id is not None
+            and document1.tfidf_version == document2.tfidf_version == corpus_index.version):
+        vector1 = tfidf_index.deserialize_vector(document1.tfidf_vector, corpus_index.n_features)
+        vector2 = tfidf_index.deserialize_vector(document2.tfidf_vector, corpus_index.n_features)
+        return tfidf_index.cosine(vector1, vector2) * 100
+    return calculate_similarity(get_full_text(document1), get_full_text(document2))
+
+# Индекс ближайших документов в памяти процесса. Пересобирается, когда меняется
+# версия словаря или набор сохранённых векторов.
+_neighbour_index = {'key': None, 'index': None}
+
+def get_neighbour_index():
+    indexed = Document.tfidf_version == corpus_index.version
+    fingerprint = db.session.query(
+        db.func.count(Document.id),
+        db.func.max(Document.id),
+        db.func.sum(db.func.length(Document.tfidf_vector)),
+    ).filter(indexed).one()
+    key = (corpus_index.version, *fingerprint)
+    if _neighbour_index['key'] != key:
+        rows = db.session.query(Document.id, Document.tfidf_vector).filter(indexed).order_by(Document.id).all()
+        matrix = tfidf_index.stack_vectors([row.tfidf_vector for row in rows], corpus_index.n_features)
+        index = tfidf_index.NeighbourIndex(
+            [row.id for row in rows], matrix, lsh_min_documents=app.config['SIMILAR_LSH_MIN_DOCUMENTS']
+        )
+        _neighbour_index.update(key=key, index=index)
+    return _neighbour_index['index']
+
+# k самых похожих документов с процентом схожести; None, если документ ещё не проиндексирован
+def find_similar_documents(document, k):
+    if not corpus_index.fitted or document.tfidf_version != corpus_index.version:
+        return None
+    pairs = get_neighbour_index().top_k(document.id, k)
+    documents = {doc.id: doc for doc in Document.query.filter(Document.id.in_([pair[0] for pair in pairs]))}
+    return [(documents[document_id], score * 100) for document_id, score in pairs if document_id in documents]
+
+# LSH-индекс MinHash-сигнатур в памяти процесса. Дополняется сигнатурами, записанными
+# с прошлого обращения (по minhash_seq, а не по id: обработчики очереди завершают разбор
+# не по порядку id); удалённые отсеиваются при проверке кандидатов по базе.
+_duplicate_index = {'max_seq': 0, 'lsh': minhash.LSHIndex(shingle_hasher.num_perm)}
+
+def get_duplicate_index():
+    rows = db.session.query(Document.id, Document.minhash, Document.minhash_seq).filter(
+        Document.minhash.isnot(None), Document.minhash_seq > _duplicate_index['max_seq']
+    ).order_by(Document.minhash_seq)
+    for row in rows:
+        _duplicate_index['lsh'].add(row.id, minhash.signature_from_bytes(row.minhash))
+        _duplicate_index['max_seq'] = row.minhash_seq
+    return _duplicate_index['lsh']
+
+# Номер для minhash_seq считается в том же UPDATE, что пишет сигнатуру: запись в SQLite
+# идёт под блокировкой базы, поэтому номера выдаются в порядке фиксации транзакций
+def next_minhash_seq():
+    return db.select(db.func.coalesce(db.func.max(Document.minhash_seq), 0) + 1).scalar_subquery()
+
+# Подсчёт MinHash-сигнатуры документа и пометка почти-копии среди уже загруженных
+def flag_near_duplicate(document):
+    shingles = minhash.iter_shingles(iter_document_pages(document), app.config['SHINGLE_SIZE'])
+    signature = shingle_hasher.signature(shingles)
+    document.minhash = minhash.signature_to_bytes(signature)
+    document.minhash_seq = next_minhash_seq()
+    document.near_duplicate_of_id = None
+    document.near_duplicate_score = None
+
+    candidates = get_duplicate_index().query(signature)
+    candidates.discard(document.id)
+    if candidates:
+        rows = db.session.query(Document.id, Document.minhash).filter(
+            Document.id.in_(candidates), Document.minhash.isnot(None)
+        )
+        scores = [(minhash.jaccard(signature, minhash.signature_from_bytes(row.minhash)), row.id) for row in rows]
+        best_score, best_id = max(scores, default=(0.0, None))
+        if best_score >= app.config['NEAR_DUPLICATE_THRESHOLD']:
+            document.near_duplicate_of_id = best_id
+            document.near_duplicate_score = best_score
+    db.session.commit()
+    _duplicate_index['lsh'].add(document.id, signature)
+
+# Пересчёт вектора документа по текущему словарю и обновление схожести с остальными
+def update_document_vector(document):
+    if not corpus_index.fitted:
+        return
+    with metrics.stage('tfidf'):
+        vector = corpus_index.transform(iter_document_pages(document))
+    document.tfidf_vector = tfidf_index.serialize_vector(vector)
+    document.tfidf_version = corpus_index.version
+
+    others = db.session.query(Document.id, Document.tfidf_vector, Document.similarity).filter(
+        Document.id != document.id,
+        Document.tfidf_version == corpus_index.version,
+    ).all()
+    if others:
+        matrix = tfidf_index.stack_vectors([row.tfidf_vector for row in others], corpus_index.n_features)
+        scores = (matrix @ vector.T).toarray().ravel() * 100
+        document.similarity = float(scores.max())
+        for row, score in zip(others, scores):
+            if row.similarity is None or score > row.similarity:
+                Document.query.filter_by(id=row.id).update({'similarity': float(score)})
+    db.session.commit()
+
+# Пересчёт наибольшей схожести документов, у которых она достигалась на удаляемых документах.
+# Вызывается до удаления; транзакцию фиксирует вызывающий код
+def forget_similarities(document_ids):
+    if not corpus_index.fitted:
+        return
+    document_ids = set(document_ids)
+    rows = db.session.query(Document.id, Document.tfidf_vector, Document.similarity).filter(
+        Document.tfidf_version == corpus_index.version
+    ).all()
+    removed = [row for row in rows if row.id in document_ids]
+    remaining = [row for row in rows if row.id not in document_ids]
+    if not removed or not remaining:
+        return
+    matrix = tfidf_index.stack_vectors([row.tfidf_vector for row in remaining], corpus_index.n_features)
+    removed_matrix = tfidf_index.stack_vectors([row.tfidf_vector for row in removed], corpus_index.n_features)
+    lost = (matrix @ removed_matrix.T).max(axis=1).toarray().ravel() * 100
+    affected = [
+        position for position, (row, score) in enumerate(zip(remaining, lost))
+        if row.similarity is not None and score >= row.similarity - 1e-6
+    ]
+    if not affected:
+        return
+    scores = (matrix[affected] @ matrix.T).tolil()
+    for number, position in enumerate(affected):
+        scores[number, position] = 0  # Схожесть документа с самим собой не считается
+    scores = scores.tocsr().max(axis=1).toarray().ravel() * 100
+    db.session.bulk_update_mappings(Document, [
+        {'id': remaining[position].id, 'similarity': float(score) if len(remaining) > 1 else None}
+        for position, score in zip(affected, scores)
+    ])
+
+# Постановка переобучения индекса, если корпус заметно изменился с момента обучения
+def schedule_tfidf_refit():
+    documents = Document.query.count()
+    changed = abs(documents - corpus_index.refresh().fitted_documents)
+    if not documents or (corpus_index.fitted and changed <= app.config['TFIDF_REFIT_FRACTION'] * corpus_index.fitted_documents):
+        return
+    if Job.query.filter(Job.kind == 'tfidf_refit', Job.status.in_(('pending', 'running'))).first():
+        return
+    submit_job('tfidf_refit')
+
+# Поиск дат в тексте документа и сохранение их в таблицу document_date.
+# В Document.dates остаётся список различных дат для показа в реестре.
+@metrics.stage('dates')
+def store_document_dates(document, page_dates=None):
+    if page_dates is None:
+        page_dates = date_extract.iter_page_dates(iter_document_pages(document))
+    DocumentDate.query.filter_by(document_id=document.id).delete()
+    rows = []
+    shown = {}
+    for page_number, found in page_dates:
+        rows.append({
+            'document_id': document.id,
+            'date': found.value,
+            'precision': found.precision,
+            'page_number': page_number,
+            'offset': found.start,
+            'text': found.text[:50],
+        })
+        shown.setdefault(found.value, format_found_date(found))
+    if rows:
+        db.session.execute(DocumentDate.__table__.insert(), rows)
+    document.dates = ', '.join(shown.values())
+    return rows
+
+def format_found_date(found):
+    if found.precision == date_extract.YEAR:
+        return found.value.strftime('%Y')
+    if found.precision == date_extract.MONTH:
+        return found.value.strftime('%m-%Y')
+    return found.value.strftime('%d-%m-%Y')
+
+# Колонки, которые показывает реестр; текст и резюме документов не загружаются
+REGISTRY_COLUMNS = (
+    'id', 'title', 'filename', 'upload_date', 'dates', 'similarity', 'has_summary',
+    'duplicate_of_id', 'near_duplicate_of_id', 'near_duplicate_score',
+)
+REGISTRY_SORT_COLUMNS = {'upload_date': Document.upload_date, 'title': Document.title, 'filename': Document.filename}
+
+# Запрос реестра с фильтрами из параметров: q (название), date_from, date_to (дата загрузки, ГГГГ-ММ-ДД),
+# mentioned_from, mentioned_to (даты, упомянутые в тексте), has_summary (1/0)
+def registry_query(args):
+    columns = [getattr(Document, name) for name in REGISTRY_COLUMNS]
+    related = load_only(Document.id, Document.filename)
+    return Document.query.options(
+        load_only(*columns),
+        selectinload(Document.duplicate_of).options(related),
+        selectinload(Document.near_duplicate_of).options(related),
+    ).filter(*registry_filters(args))
+
+REGISTRY_FILTERS = ('q', 'date_from', 'date_to', 'mentioned_from', 'mentioned_to', 'has_summary')
+
+def registry_filters(args):
+    filters = []
+    title = args.get('q', '').strip()
+    if title:
+        filters.append(Document.title.ilike(f'%{title}%'))
+    date_from = args.get('date_from', type=parse_date)
+    if date_from:
+        filters.append(Document.upload_date >= date_from)
+    date_to = args.get('date_to', type=parse_date)
+    if date_to:
+        filters.append(Document.upload_date < date_to + timedelta(days=1))
+    mentioned_from = args.get('mentioned_from', type=parse_date)
+    mentioned_to = args.get('mentioned_to', type=parse_date)
+    if mentioned_from or mentioned_to:
+        filters.append(Document.id.in_(documents_mentioning(mentioned_from, mentioned_to)))
+    if args.get('has_summary') == '1':
+        filters.append(Document.summary.isnot(None))
+    elif args.get('has_summary') == '0':
+        filters.append(Document.summary.is_(None))
+    return filters
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+# Подзапрос id документов, в тексте которых упомянута дата из диапазона (границы включительно)
+def documents_mentioning(date_from=None, date_to=None):
+    query = db.select(DocumentDate.document_id)
+    if date_from:
+        query = query.where(DocumentDate.date >= date_from.date())
+    if date_to:
+        query = query.where(DocumentDate.date <= date_to.date())
+    return query
+
+# Диапазон дат из параметров: from и to (ГГГГ-ММ-ДД) или quarter (2024-Q3)
+def parse_date_range(args):
+    quarter = args.get('quarter', '').upper()
+    if quarter:
+        year, _, number = quarter.partition('-Q')
+        year, number = int(year), int(number)
+        if not 1 <= number <= 4:
+            raise ValueError('Неверный квартал')
+        date_from = datetime(year, 3 * number - 2, 1)
+        date_to = (datetime(year + 1, 1, 1) if number == 4 else datetime(year, 3 * number + 1, 1)) - timedelta(days=1)
+        return date_from, date_to
+    return args.get('from', type=parse_date), args.get('to', type=parse_date)
+
+# Документы, в которых упоминаются даты из диапазона: число упоминаний, первая и последняя дата.
+# Постраничный вывод по ключу: after — id последнего документа предыдущей страницы.
+@app.route('/api/dates')
+@login_required
+def date_range_api():
+    try:
+        date_from, date_to = parse_date_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Неверный квартал, ожидается формат 2024-Q3.'}), 400
+    if not (date_from or date_to):
+        return jsonify({'error': 'Укажите from, to или quarter.'}), 400
+    limit = max(1, min(request.args.get('limit', app.config['REGISTRY_PAGE_SIZE'], type=int), app.config['REGISTRY_MAX_PAGE_SIZE']))
+    after = request.args.get('after', 0, type=int)
+
+    conditions = []
+    if date_from:
+        conditions.append(DocumentDate.date >= date_from.date())
+    if date_to:
+        conditions.append(DocumentDate.date <= date_to.date())
+    rows = db.session.query(
+        DocumentDate.document_id,
+        db.func.count().label('mentions'),
+        db.func.min(DocumentDate.date).label('first_date'),
+        db.func.max(DocumentDate.date).label('last_date'),
+    ).filter(*conditions, DocumentDate.document_id > after).group_by(DocumentDate.document_id).order_by(
+        DocumentDate.document_id
+    ).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].document_id
+
+    ids = [row.document_id for row in rows]
+    documents = {
+        document.id: document
+        for document in Document.query.options(load_only(Document.id, Document.title, Document.filename)).filter(Document.id.in_(ids))
+    } if ids else {}
+    mentions = {}
+    if ids and request.args.get('mentions') == '1':
+        for mention in DocumentDate.query.filter(*conditions, DocumentDate.document_id.in_(ids)).order_by(DocumentDate.id):
+            mentions.setdefault(mention.document_id, []).append({
+                'date': mention.date.isoformat(),
+                'precision': mention.precision,
+                'page': mention.page_number,
+                'offset': mention.offset,
+                'text': mention.text,
+            })
+
+    results = []
+    for row in rows:
+        document = documents.get(row.document_id)
+        if document is None:  # Документ удалён между запросами
+            continue
+        result = {
+            'id': document.id,
+            'title': document.title,
+            'filename': document.filename,
+            'mentions': row.mentions,
+            'first_date': row.first_date.isoformat(),
+            'last_date': row.last_date.isoformat(),
+        }
+        if request.args.get('mentions') == '1':
+            result['dates'] = mentions.get(row.document_id, [])
+        results.append(result)
+    return jsonify({
+        'from': date_from.date().isoformat() if date_from else None,
+        'to': date_to.date().isoformat() if date_to else None,
+        'results': results,
+        'next_cursor': next_cursor,
+    })
+
+# Поле и направление сортировки из параметров sort и order
+def registry_sort(args):
+    sort = args.get('sort', 'upload_date')
+    if sort not in REGISTRY_SORT_COLUMNS:
+        sort = 'upload_date'
+    order = 'asc' if args.get('order') == 'asc' else 'desc'
+    return sort, order
 
 # Маршрут для отображения реестра документов
 @app.route('/documents')
 @login_required
 def document_registry():
-    documents = Document.query.all()  # Получаем все документы из базы данных
-    return render_template('documents.html', documents=documents)
+    sort, order = registry_sort(request.args)
+    column = REGISTRY_SORT_COLUMNS[sort]
+    query = registry_query(request.args).order_by(
+        *((column.asc(), Document.id.asc()) if order == 'asc' else (column.desc(), Document.id.desc()))
+    )
+    pagination = query.paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', app.config['REGISTRY_PAGE_SIZE'], type=int),
+        max_per_page=app.config['REGISTRY_MAX_PAGE_SIZE'],  # Без него Flask-SQLAlchemy может ограничить страницу сотней строк
+        error_out=False,
+    )
+    documents = pagination.items
+    # Последняя задача по каждому документу страницы, чтобы показать её состояние
+    latest_jobs = {}
+    if documents:
+        jobs = Job.query.filter(Job.document_id.in_([document.id for document in documents])).order_by(Job.id)
+        for job in jobs:
+            latest_jobs[job.document_id] = job
+    # Параметры фильтра и сортировки для ссылок на другие страницы
+    filters = {key: value for key, value in request.args.items() if key not in ('page', 'sort', 'order') and value}
+    return render_template(
+        'documents.html', documents=documents, pagination=pagination, jobs=latest_jobs,
+        job_labels=JOB_STATUS_LABELS, sort=sort, order=order, filters=filters,
+    )
 
-# Маршрут для анализа файлов
+# Реестр в JSON с постраничным выводом по ключу: after — курсор из next_cursor предыдущего ответа
+@app.route('/api/documents')
+@login_required
+def document_registry_api():
+    sort, order = registry_sort(request.args)
+    column = REGISTRY_SORT_COLUMNS[sort]
+    limit = max(1, min(request.args.get('limit', app.config['REGISTRY_PAGE_SIZE'], type=int), app.config['REGISTRY_MAX_PAGE_SIZE']))
+    query = registry_query(request.args)
+
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            value, last_id = decode_registry_cursor(cursor, sort)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Неверный курсор.'}), 400
+        if order == 'asc':
+            query = query.filter(or_(column > value, and_(column == value, Document.id > last_id)))
+        else:
+            query = query.filter(or_(column < value, and_(column == value, Document.id < last_id)))
+    query = query.order_by(
+        *((column.asc(), Document.id.asc()) if order == 'asc' else (column.desc(), Document.id.desc()))
+    )
+
+    documents = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_registry_cursor(documents[-1], sort)
+    return jsonify({
+        'results': [
+            {
+                'id': document.id,
+                'title': document.title,
+                'filename': document.filename,
+                'upload_date': document.upload_date.isoformat(),
+                'dates': document.dates,
+                'similarity': document.similarity,
+                'has_summary': document.has_summary,
+                'duplicate_of_id': document.duplicate_of_id,
+                'near_duplicate_of_id': document.near_duplicate_of_id,
+            }
+            for document in documents
+        ],
+        'next_cursor': next_cursor,
+    })
+
+# Курсор — значение поля сортировки и id последнего документа страницы
+def encode_registry_cursor(document, sort):
+    value = getattr(document, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, document.id]).encode('utf-8')).decode('ascii')
+
+def decode_registry_cursor(cursor, sort):
+    value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if sort == 'upload_date':
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, str):
+        raise ValueError('Неверное значение курсора')
+    return value, int(last_id)
+
+# Резюме загружается отдельно, когда пользователь раскрывает его в реестре
+@app.route('/api/documents/<int:document_id>/summary')
+@login_required
+def document_summary_api(document_id):
+    document = Document.query.options(load_only(Document.id, Document.summary)).get_or_404(document_id)
+    return jsonify({'document_id': document.id, 'summary': document.summary})
+
+# Состояние фоновых задач для опроса со страницы реестра
+@app.route('/jobs')
+@login_required
+def job_status():
+    ids = [int(job_id) for job_id in request.args.get('ids', '').split(',') if job_id.isdigit()]
+    jobs = Job.query.filter(Job.id.in_(ids)).all() if ids else []
+    return jsonify([job.to_dict() for job in jobs])
+
+# Маршрут для анализа файлов: сама работа выполняется в фоновой задаче
 @app.route('/analyze/<filename>')
 @login_required
 def analyze(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    print(f"Начинаем анализ файла: {file_path}")
+    document = Document.query.filter_by(filename=filename).order_by(Document.id.desc()).first()
+    if document is None:
+        document = Document(title=filename, filename=filename)
+        db.session.add(document)
+    submit_job('analyze', document)
 
-    try:
-        text = extract_text_from_pdf(file_path)
-
-        if not text:
-            flash('Не удалось извлечь текст из PDF-файла.')
-            return redirect(url_for('list_files'))
-
-        # Генерация резюме с помощью OpenAI
-        final_summary = generate_summary_with_openai(text)
-        print(f"Сгенерированное резюме: {final_summary}")
-
-        # Ищем даты в тексте
-        raw_dates_found = find_dates_in_text(text)
-        print(f"Найденные даты: {raw_dates_found}")
-
-        # Фильтруем и форматируем даты
-        formatted_dates = filter_and_format_dates(raw_dates_found)
-        print(f"Отформатированные даты: {formatted_dates}")
-
-        # Сохранение результатов анализа в базу данных
-        document = Document(
-            title=filename,
-            content=text,
-            filename=filename,
-            summary=final_summary,
-            dates=', '.join([date.strftime('%d-%m-%Y') for date in formatted_dates])
+    flash(f'Анализ файла {filename} поставлен в очередь.')
+    return redirect(url_for('document_registry'))
+
+# Постановка задачи в очередь (или немедленное выполнение при JOBS_INLINE)
+def submit_job(kind, document=None):
+    job = job_queue.enqueue(kind, document=document)
+    if app.config['JOBS_INLINE']:
+        job_queue.run_inline(job)
+    return job
+
+# Фоновая задача: извлечение текста загруженного файла
+@job_queue.handler('ingest')
+def ingest_job(job):
+    document = job.document
+    if document is None:  # Документ удалён, пока задача ждала в очереди
+        return
+
+    # Страницы пишутся в базу по мере разбора, весь текст в памяти не собирается
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], document.filename)
+    total = pdf_extract.page_count(file_path)
+    DocumentPage.query.filter_by(document_id=document.id).delete()  # Повторная попытка начинает с чистого листа
+    document.page_count = 0
+    pages = metrics.timed_iter('pdf_extract', pdf_extract.iter_pages(
+        file_path,
+        workers=app.config['PDF_EXTRACT_WORKERS'],
+        min_pages=app.config['PDF_PARALLEL_MIN_PAGES'],
+        ordered=True,
+    ))
+    for number, text in pages:
+        db.session.add(DocumentPage(document_id=document.id, page_number=number + 1, content=text))
+        if (number + 1) % app.config['INGEST_COMMIT_PAGES'] == 0:
+            document.page_count = number + 1
+            job_queue.set_progress(job, (number + 1) * 100 // total)
+    document.page_count = total
+    store_document_dates(document)
+    update_search_index(document)
+    db.session.commit()
+
+    flag_near_duplicate(document)
+    update_document_vector(document)
+    schedule_tfidf_refit()
+
+# Фоновая задача: переобучение словаря TF-IDF на всём корпусе и пересчёт векторов
+@job_queue.handler('tfidf_refit')
+def tfidf_refit_job(job):
+    # Только документы, из которых уже извлечён текст
+    rows = Document.query.options(load_only(Document.id, Document.filename, Document.page_count)).filter(
+        Document.page_count > 0
+    ).all()
+    if not rows:
+        return
+    with metrics.stage('tfidf'):
+        corpus_index.fit(get_full_text(row) for row in rows)
+    job_queue.set_progress(job, 30)
+
+    for number, row in enumerate(rows, start=1):
+        with metrics.stage('tfidf'):
+            vector = corpus_index.transform(iter_document_pages(row))
+        Document.query.filter_by(id=row.id).update({
+            'tfidf_vector': tfidf_index.serialize_vector(vector),
+            'tfidf_version': corpus_index.version,
+        })
+        if number % app.config['INGEST_COMMIT_PAGES'] == 0:
+            job_queue.set_progress(job, 30 + number * 60 // len(rows))
+    db.session.commit()
+
+    # Наибольшая схожесть каждого документа с остальными — одним произведением матриц
+    rows = db.session.query(Document.id, Document.tfidf_vector).filter(
+        Document.tfidf_version == corpus_index.version
+    ).all()
+    matrix = tfidf_index.stack_vectors([row.tfidf_vector for row in rows], corpus_index.n_features)
+    scores = tfidf_index.max_similarities(matrix) * 100
+    db.session.bulk_update_mappings(Document, [
+        {'id': row.id, 'similarity': float(score)} for row, score in zip(rows, scores)
+    ])
+    db.session.commit()
+
+# Фоновая задача: резюме и поиск дат
+@job_queue.handler('analyze')
+def analyze_job(job):
+    document = job.document
+    if document is None:
+        return
+    print(f"Начинаем анализ файла: {document.filename}")
+
+    text = get_full_text(document)
+    if not text:
+        raise ValueError('Не удалось извлечь текст из PDF-файла.')
+    job_queue.set_progress(job, 20)
+
+    # Генерация резюме с помощью OpenAI
+    final_summary = summarize_document(document)
+    print(f"Сгенерированное резюме: {final_summary}")
+    job_queue.set_progress(job, 80)
+
+    # Ищем даты в тексте и сохраняем результаты анализа в базу данных
+    found_dates = store_document_dates(document)
+    print(f"Найдено дат: {len(found_dates)}")
+    document.summary = final_summary
+    update_search_index(document)
+    db.session.commit()
+
+# Пакетный анализ: документы делятся на задачи 'analyze_batch' по ANALYZE_BATCH_CHUNK штук
+def create_analysis_batch(document_ids, description=None, chunk_size=None):
+    chunk_size = chunk_size or app.config['ANALYZE_BATCH_CHUNK']
+    batch = AnalysisBatch(description=description, total=len(document_ids))
+    db.session.add(batch)
+    db.session.flush()
+    db.session.bulk_insert_mappings(AnalysisBatchItem, [
+        {'batch_id': batch.id, 'document_id': document_id, 'status': 'pending'} for document_id in document_ids
+    ])
+    jobs = [
+        job_queue.enqueue('analyze_batch', commit=False, payload=json.dumps({
+            'batch_id': batch.id, 'document_ids': document_ids[start:start + chunk_size],
+        }))
+        for start in range(0, len(document_ids), chunk_size)
+    ]
+    if not document_ids:
+        batch.finished_at = datetime.utcnow()
+    db.session.commit()
+    if app.config['JOBS_INLINE']:
+        for job in jobs:
+            job_queue.run_inline(job)
+    return batch
+
+# Фоновая задача: анализ пачки документов. Извлечение текста, резюме и поиск дат
+# для всех документов пачки идут одновременно в одном цикле событий, запросы к LLM
+# ограничены общим семафором и лимитом в минуту; в базу всё пишется одной транзакцией.
+@job_queue.handler('analyze_batch')
+def analyze_batch_job(job):
+    payload = json.loads(job.payload)
+    batch_id = payload['batch_id']
+    # При повторной попытке уже обработанные документы пропускаются
+    items = AnalysisBatchItem.query.filter(
+        AnalysisBatchItem.batch_id == batch_id,
+        AnalysisBatchItem.document_id.in_(payload['document_ids']),
+        AnalysisBatchItem.status == 'pending',
+    ).all()
+    documents = {
+        document.id: document
+        for document in Document.query.filter(Document.id.in_([item.document_id for item in items]))
+    }
+
+    work = []
+    outcomes = []  # (пункт, документ, результат анализа или исключение)
+    for item in items:
+        document = documents.get(item.document_id)
+        if document is None:
+            outcomes.append((item, None, LookupError('Документ удалён.')))
+            continue
+        # Страницы читаются из базы здесь: в потоках и корутинах к сессии не обращаемся
+        pages = [page.content for page in document.pages] if document.page_count else None
+        work.append((item, document, pages))
+    job_queue.set_progress(job, 10)
+
+    # Пока идёт анализ, задача периодически обновляет updated_at: иначе claim_next
+    # сочтёт её зависшей и отдаст тот же пакет другому процессу
+    def heartbeat(completed):
+        job_queue.set_progress(job, 10 + completed * 80 // max(len(work), 1))
+
+    results = asyncio.run(analyze_documents([
+        (document.filename, get_content_hash(document), pages) for item, document, pages in work
+    ], heartbeat))
+    outcomes.extend((item, document, result) for (item, document, pages), result in zip(work, results))
+
+    done = failed = 0
+    for item, document, result in outcomes:
+        fields = {'finished_at': datetime.utcnow()}
+        if isinstance(result, Exception):
+            fields.update(status='failed', error=str(result) or type(result).__name__)
+        else:
+            summary, page_dates, timings = result
+            fields.update(status='done', extract_seconds=timings[0], summary_seconds=timings[1], dates_seconds=timings[2])
+        # Пункт мог уже записать процесс, забравший задачу как зависшую: результаты и
+        # счётчики учитываются, только если пункт всё ещё ожидает обработки
+        claimed = AnalysisBatchItem.query.filter_by(id=item.id, status='pending').update(
+            fields, synchronize_session=False
         )
-        db.session.add(document)
-        db.session.commit()
+        if not claimed:
+            continue
+        if isinstance(result, Exception):
+            failed += 1
+            continue
+        document.summary = summary
+        store_document_dates(document, page_dates)
+        update_search_index(document)
+        done += 1
+
+    # Счётчики увеличиваются в самом UPDATE: пачки одного пакета выполняют разные процессы
+    AnalysisBatch.query.filter_by(id=batch_id).update(
+        {'done': AnalysisBatch.done + done, 'failed': AnalysisBatch.failed + failed},
+        synchronize_session=False,
+    )
+    AnalysisBatch.query.filter(
+        AnalysisBatch.id == batch_id,
+        AnalysisBatch.done + AnalysisBatch.failed >= AnalysisBatch.total,
+        AnalysisBatch.finished_at.is_(None),
+    ).update({'finished_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    print(f'Пакет {batch_id}: обработано {done}, с ошибкой {failed}')
+
+# Конвейер пакетного анализа: [(имя файла, хэш содержимого, страницы или None)] ->
+# [(резюме, даты по страницам, (время извлечения, резюме, дат)) или исключение]
+# heartbeat(число готовых документов) вызывается раз в ANALYZE_BATCH_HEARTBEAT_SECONDS
+async def analyze_documents(documents, heartbeat=None):
+    loop = asyncio.get_running_loop()
+    limits = document_summarizer.limits()
+    completed = 0
+    with ThreadPoolExecutor(app.config['ANALYZE_BATCH_EXTRACT_THREADS']) as executor:
+        async def analyze_one(filename, content_hash, pages):
+            started = time.perf_counter()
+            if pages is None:
+                pages = [await loop.run_in_executor(executor, get_document_text, filename)]
+            if not ''.join(pages).strip():
+                raise ValueError('Не удалось извлечь текст из PDF-файла.')
+            extracted = time.perf_counter()
+
+            key = summary_store_key(content_hash) if content_hash else None
+            summary = summary_store.get(key) if key else None
+            if summary is None:
+                summary = await document_summarizer.asummarize(pages, limits)
+                if key:
+                    summary_store.put(key, summary)
+                if app.config['SUMMARY_PERSIST_FILES']:
+                    save_summary_file(filename, summary)
+            summarized = time.perf_counter()
+
+            page_dates = await loop.run_in_executor(
+                executor, lambda: list(date_extract.iter_page_dates(pages))
+            )
+            timings = (extracted - started, summarized - extracted, time.perf_counter() - summarized)
+            return summary, page_dates, timings
 
-        flash(f"Резюме и найденные даты успешно сохранены.")
-        return render_template('analyze.html', summary=final_summary, dates=formatted_dates, filename=filename)
+        async def tracked(document):
+            nonlocal completed
+            try:
+                return await analyze_one(*document)
+            finally:
+                completed += 1
+
+        async def beat():
+            while True:
+                await asyncio.sleep(app.config['ANALYZE_BATCH_HEARTBEAT_SECONDS'])
+                heartbeat(completed)
+
+        beating = asyncio.ensure_future(beat()) if heartbeat else None
+        try:
+            return await asyncio.gather(*(tracked(document) for document in documents), return_exceptions=True)
+        finally:
+            if beating is not None:
+                beating.cancel()
+
+# Запуск пакетного анализа: список id (JSON {"ids": [...]} или ids=1,2,3) либо фильтры реестра
+@app.route('/analyze_batch', methods=['POST'])
+@login_required
+def analyze_batch():
+    data = request.get_json(silent=True) or {}
+    # Явно переданный список (даже пустой) фильтрами реестра не заменяется
+    explicit = 'ids' in data or 'ids' in request.values
+    if 'ids' in data:
+        ids = data['ids']
+    else:
+        ids = [value.strip() for value in request.values.get('ids', '').split(',') if value.strip()]
+        ids = [int(value) if value.isdigit() else value for value in ids]
+    if explicit and (not isinstance(ids, list) or not ids or not all(type(value) is int for value in ids)):
+        return jsonify({'error': 'ids должен быть непустым списком целых чисел.'}), 400
+    if explicit:
+        ids = [row.id for row in db.session.query(Document.id).filter(Document.id.in_(ids)).order_by(Document.id)]
+        description = 'Выбранные документы'
+    else:
+        args = request.values.copy()
+        for key, value in data.items():
+            if key != 'ids':
+                args[key] = str(value)
+        ids = [row.id for row in db.session.query(Document.id).filter(*registry_filters(args)).order_by(Document.id)]
+        description = 'Фильтр: ' + (', '.join(
+            f'{key}={args[key]}' for key in REGISTRY_FILTERS if args.get(key)
+        ) or 'все документы')
+    batch = create_analysis_batch(ids, description[:255])
+
+    if request.is_json:
+        return jsonify({**batch.to_dict(), 'status_url': url_for('analyze_batch_status', batch_id=batch.id)}), 202
+    flash(f'Пакетный анализ №{batch.id}: документов в очереди — {batch.total}.')
+    return redirect(url_for('document_registry'))
 
-    except Exception as e:
-        print(f'Ошибка при анализе файла: {e}')
-        flash(f'Ошибка при анализе файла: {e}')
-        return redirect(url_for('list_files'))
+# Ход пакетного анализа и время этапов по каждому документу
+@app.route('/analyze_batch/<int:batch_id>')
+@login_required
+def analyze_batch_status(batch_id):
+    batch = AnalysisBatch.query.get_or_404(batch_id)
+    items = batch.items.order_by(AnalysisBatchItem.document_id)
+    if request.args.get('status'):
+        items = items.filter(AnalysisBatchItem.status == request.args['status'])
+    return jsonify({
+        **batch.to_dict(),
+        'timings': batch_timings(batch_id),
+        'items': [item.to_dict() for item in items],
+    })
+
+# Среднее и максимальное время этапов по успешно обработанным документам пакета
+def batch_timings(batch_id):
+    func = db.func
+    columns = {
+        'extract': AnalysisBatchItem.extract_seconds,
+        'summary': AnalysisBatchItem.summary_seconds,
+        'dates': AnalysisBatchItem.dates_seconds,
+    }
+    row = db.session.query(*(
+        aggregate(column) for column in columns.values() for aggregate in (func.avg, func.max)
+    )).filter(AnalysisBatchItem.batch_id == batch_id, AnalysisBatchItem.status == 'done').one()
+    return {
+        name: {'avg': row[2 * number], 'max': row[2 * number + 1]}
+        for number, name in enumerate(columns)
+    }
 
 # Функция для извлечения текста из PDF
+@metrics.stage('pdf_extract')
 def extract_text_from_pdf(file_path):
     try:
-        with open(file_path, 'rb') as file:
-            reader = PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-        return text
+        return pdf_extract.extract_text(
+            file_path,
+            workers=app.config['PDF_EXTRACT_WORKERS'],
+            min_pages=app.config['PDF_PARALLEL_MIN_PAGES'],
+        ).text
     except Exception as e:
-        flash(f'Ошибка при извлечении текста из PDF файла: {e}')
+        if has_request_context():
+            flash(f'Ошибка при извлечении текста из PDF файла: {e}')
+        else:
+            print(f'Ошибка при извлечении текста из PDF файла {file_path}: {e}')
         return ""
 
+# Получение текста загруженного файла через кэш, чтобы не разбирать PDF повторно
+def get_document_text(filename):
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    return text_cache.get_or_extract(file_path, extract_text_from_pdf)
+
+# Тексты страниц документа по порядку. Для файлов, текст которых ещё не извлечён,
+# весь текст считается одной страницей.
+def iter_document_pages(document):
+    if document.page_count:
+        for page in document.pages.yield_per(app.config['INGEST_COMMIT_PAGES']):
+            yield page.content
+    else:
+        yield get_document_text(document.filename)
+
+# Полный текст документа, когда он нужен целиком (резюме, поиск дат, схожесть)
+def get_full_text(document):
+    return ''.join(iter_document_pages(document))
+
+# Текст одной страницы и общее число страниц документа
+def get_page_text(document, page_number):
+    if document.page_count:
+        page = document.pages.filter_by(page_number=page_number).first()
+        return (page.content if page else ''), document.page_count
+    return (get_full_text(document) if page_number == 1 else ''), 1
+
 # Функция для генерации резюме с помощью OpenAI
+# Длинный текст суммируется по частям (map-reduce), резюме частей кэшируются
 def generate_summary_with_openai(text):
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",  
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": f"Сделай резюме для следующего текста: {text}"}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        summary = response['choices'][0]['message']['content'].strip()
-        return summary
+        return document_summarizer.summarize([text])
     except Exception as e:
         print(f"Ошибка при создании резюме с помощью OpenAI: {e}")
         return "Ошибка при создании резюме."
 
+# Резюме документа из хранилища; если его там нет — один запрос к LLM на ключ,
+# даже когда резюме одновременно запрашивают несколько пользователей
+def summarize_document(document):
+    content_hash = get_content_hash(document)
+    if content_hash is None:
+        return generate_summary_with_openai(get_full_text(document))
+    key = summary_store_key(content_hash)
+
+    def produce():
+        summary = summary_store.get(key)  # Пока ждали блокировку, резюме мог сделать другой процесс
+        if summary is None:
+            summary = document_summarizer.summarize(iter_document_pages(document))
+            summary_store.put(key, summary)
+            if app.config['SUMMARY_PERSIST_FILES']:
+                save_summary_file(document.filename, summary)
+        return summary
+
+    summary = summary_store.get(key)
+    if summary is None:
+        summary = summary_flight.do(key, produce)
+    return summary
+
+def summary_store_key(content_hash):
+    return hashlib.sha256(
+        f'{content_hash}:{app.config["SUMMARY_MODEL"]}:{summarizer.PROMPT_VERSION}'.encode('utf-8')
+    ).hexdigest()
+
+# Копия резюме в папке summaries: summary_<имя файла без расширения>.txt
+def save_summary_file(filename, summary):
+    os.makedirs(app.config['SUMMARY_FOLDER'], exist_ok=True)
+    name = os.path.splitext(filename)[0]
+    with open(os.path.join(app.config['SUMMARY_FOLDER'], f'summary_{name}.txt'), 'w', encoding='utf-8') as file:
+        file.write(summary)
+
 # Маршрут для сравнения файлов с подсветкой совпадающих слов
 @app.route('/compare_files', methods=['GET', 'POST'])
 @login_required
 def compare_files():
     files = os.listdir(app.config['UPLOAD_FOLDER'])
-    if request.method == 'POST':
-        file1 = request.form['file1']
-        file2 = request.form['file2']
-
-        # Извлечение текста из выбранных файлов
-        text1 = extract_text_from_pdf(os.path.join(app.config['UPLOAD_FOLDER'], file1))
-        text2 = extract_text_from_pdf(os.path.join(app.config['UPLOAD_FOLDER'], file2))
-
-        # Вычисление процента схожести
-        similarity_percentage = calculate_similarity(text1, text2)
-
-        # Подсветка общих слов
-        highlighted_text1, highlighted_text2 = highlight_common_words(text1, text2)
-
-        return render_template(
-            'compare_files.html', 
-            files=files, 
-            file1=file1, 
-            file2=file2, 
-            text1=highlighted_text1, 
-            text2=highlighted_text2, 
-            similarity=similarity_percentage
+    if 'file1' in request.values and 'file2' in request.values:
+        file1 = request.values['file1']
+        file2 = request.values['file2']
+        page = request.args.get('page', 1, type=int)
+        return stream_comparison(
+            document_for_file(file1), document_for_file(file2), page, files=files,
+            page_args={'file1': file1, 'file2': file2}
         )
 
     return render_template('compare_files.html', files=files)
@@ -352,43 +1665,203 @@ def upload():
 
         if file:
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(file_path)
+            content_hash = save_upload(file, file_path)
+            stat = os.stat(file_path)
 
-            # Сохранение информации о документе в базе данных без лишних полей
+            # Сохранение информации о документе, текст извлекается фоновой задачей
             new_document = Document(
                 title=file.filename,
                 filename=file.filename,
-                content=extract_text_from_pdf(file_path)
+                content_hash=content_hash,
+                file_size=stat.st_size,
+                file_mtime=stat.st_mtime,
             )
             db.session.add(new_document)
-            db.session.commit()
 
-            flash('Файл успешно загружен.')
+            # Точная копия уже разобранного файла: переносим готовые результаты
+            db.session.flush()
+            original = find_ingested_original(content_hash, new_document.id)
+            if original is not None:
+                copy_document_results(original, new_document)
+                flash(f'Файл загружен. Это точная копия документа {original.filename}, повторный разбор не нужен.')
+            else:
+                submit_job('ingest', new_document)
+                flash('Файл успешно загружен, текст извлекается в фоне.')
             return redirect(url_for('document_registry'))
 
     return render_template('upload.html')
 
+# Сохранение загруженного файла по частям с одновременным подсчётом SHA-256
+def save_upload(file, file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as output:
+        for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+            digest.update(chunk)
+            output.write(chunk)
+    return digest.hexdigest()
+
+# Разобранный документ с тем же содержимым. Пока извлечение текста оригинала не завершено
+# (page_count растёт по ходу разбора) или оно упало, оригинал не подходит — такой файл
+# разбирается заново
+def find_ingested_original(content_hash, document_id):
+    unfinished_ingest = db.exists().where(
+        Job.document_id == Document.id, Job.kind == 'ingest', Job.status != 'done'
+    )
+    return Document.query.filter(
+        Document.content_hash == content_hash,
+        Document.page_count > 0,
+        Document.id != document_id,
+        ~unfinished_ingest,
+    ).first()
+
+# Копирование страниц и результатов анализа с оригинала на точную копию (без выгрузки текста в Python)
+def copy_document_results(original, document):
+    DocumentPage.query.filter_by(document_id=document.id).delete()  # Страницы прежнего содержимого файла
+    document.duplicate_of_id = original.id
+    for column in ('page_count', 'summary', 'dates', 'tfidf_vector', 'tfidf_version', 'minhash'):
+        setattr(document, column, getattr(original, column))
+    if document.minhash is not None:
+        document.minhash_seq = next_minhash_seq()
+    document.similarity = original.similarity = 100.0
+    db.session.flush()
+
+    pages = DocumentPage.__table__
+    db.session.execute(pages.insert().from_select(
+        ['document_id', 'page_number', 'content'],
+        db.select(db.literal(document.id), pages.c.page_number, pages.c.content).where(pages.c.document_id == original.id),
+    ))
+    dates = DocumentDate.__table__
+    db.session.execute(dates.insert().from_select(
+        ['document_id', 'date', 'precision', 'page_number', 'offset', 'text'],
+        db.select(
+            db.literal(document.id), dates.c.date, dates.c.precision, dates.c.page_number, dates.c.offset, dates.c.text
+        ).where(dates.c.document_id == original.id),
+    ))
+    update_search_index(document)
+    db.session.commit()
+
 @app.route('/sync_files')
 @login_required
 def sync_files():
-    files_in_folder = os.listdir(app.config['UPLOAD_FOLDER'])  # Все файлы в папке
-    existing_files = [doc.filename for doc in Document.query.all()]  # Файлы в базе данных
-
-    new_files = [f for f in files_in_folder if f not in existing_files]  # Файлы, которых нет в базе
-
-    for file in new_files:
-        new_document = Document(
-            title=file,
-            filename=file,
-            content='',  # Пустое поле для контента, если текст еще не извлечен
-            summary='',  # Пустое поле для резюме, если оно еще не сгенерировано
-            dates=''  # Пустое поле для дат
+    added, changed, removed = sync_upload_folder()
+    flash(
+        f'База данных синхронизирована с файлами в папке uploads: новых {added}, '
+        f'изменённых {changed}, удалённых {removed}.'
+    )
+    return redirect(url_for('document_registry'))
+
+# Синхронизация базы с папкой uploads. Размер и время изменения файлов сверяются
+# с сохранёнными в документах, хэш считается только для файлов, где они отличаются.
+# Новые и изменённые файлы ставятся в очередь на извлечение текста, документы
+# удалённых файлов удаляются. Возвращает число новых, изменённых и удалённых файлов.
+def sync_upload_folder():
+    batch_size = app.config['SYNC_BATCH_SIZE']
+    manifest = {
+        row.filename: row
+        for row in db.session.query(
+            Document.id, Document.filename, Document.content_hash, Document.file_size, Document.file_mtime
         )
-        db.session.add(new_document)
-    
+    }
+
+    new_rows = []
+    changed_ids = []
+    seen = set()
+    with os.scandir(app.config['UPLOAD_FOLDER']) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            known = manifest.get(entry.name)
+            if known is not None and known.file_size == stat.st_size and known.file_mtime == stat.st_mtime:
+                continue
+
+            content_hash = file_sha256(entry.path)
+            fields = {'content_hash': content_hash, 'file_size': stat.st_size, 'file_mtime': stat.st_mtime}
+            if known is None:
+                new_rows.append(dict(fields, title=entry.name, filename=entry.name, page_count=0))
+                continue
+            if known.content_hash != content_hash:
+                # Содержимое изменилось: результаты прежнего разбора больше не годятся
+                fields.update(
+                    page_count=0, summary=None, dates=None, similarity=None, tfidf_vector=None,
+                    tfidf_version=None, minhash=None, duplicate_of_id=None,
+                    near_duplicate_of_id=None, near_duplicate_score=None,
+                )
+                changed_ids.append(known.id)
+                DocumentDate.query.filter_by(document_id=known.id).delete(synchronize_session=False)
+            Document.query.filter_by(id=known.id).update(fields, synchronize_session=False)
+    db.session.commit()
+
+    # Новые документы пачками: вставка одним запросом, затем задачи на извлечение текста
+    for start in range(0, len(new_rows), batch_size):
+        batch = new_rows[start:start + batch_size]
+        now = datetime.utcnow()
+        for row in batch:
+            row['upload_date'] = row['created_at'] = now
+        db.session.execute(Document.__table__.insert(), batch)
+        ids = [
+            row.id for row in db.session.query(Document.id).filter(
+                Document.filename.in_([row['filename'] for row in batch])
+            )
+        ]
+        ingest_or_copy(ids)
+
+    for start in range(0, len(changed_ids), batch_size):
+        ingest_or_copy(changed_ids[start:start + batch_size])
+    changed = set(changed_ids)
+    for known in manifest.values():
+        if known.id in changed:
+            invalidate_comparisons(known.content_hash)
+
+    removed = [known for name, known in manifest.items() if name not in seen]
+    for start in range(0, len(removed), batch_size):
+        remove_documents([known.id for known in removed[start:start + batch_size]])
+    for known in removed:
+        invalidate_comparisons(known.content_hash)
+    if new_rows or changed_ids or removed:
+        schedule_tfidf_refit()
+    return len(new_rows), len(changed_ids), len(removed)
+
+# Точные копии уже разобранных файлов получают готовые результаты, как при загрузке,
+# для остальных документов ставятся задачи извлечения текста
+def ingest_or_copy(document_ids):
+    pending = []
+    for document in Document.query.filter(Document.id.in_(document_ids)).order_by(Document.id).all():
+        original = find_ingested_original(document.content_hash, document.id)
+        if original is None:
+            pending.append(document.id)
+        else:
+            copy_document_results(original, document)
+    enqueue_ingest(pending)
+
+# Задачи извлечения текста для пачки документов в одной транзакции
+def enqueue_ingest(document_ids):
+    jobs = [job_queue.enqueue('ingest', commit=False, document_id=document_id) for document_id in document_ids]
+    for document_id in document_ids:
+        update_search_index_by_id(document_id)  # Пока текст не извлечён, документ находится по названию
+    db.session.commit()
+    if app.config['JOBS_INLINE']:
+        for job in jobs:
+            job_queue.run_inline(job)
+
+# Удаление документов пачкой без загрузки строк (каскады выполняются явными запросами)
+def remove_documents(document_ids):
+    forget_similarities(document_ids)
+    Document.query.filter(Document.duplicate_of_id.in_(document_ids)).update(
+        {'duplicate_of_id': None}, synchronize_session=False
+    )
+    Document.query.filter(Document.near_duplicate_of_id.in_(document_ids)).update(
+        {'near_duplicate_of_id': None, 'near_duplicate_score': None}, synchronize_session=False
+    )
+    if search.is_supported(db.session):
+        for document_id in document_ids:
+            search.remove_document(db.session, document_id)
+    DocumentPage.query.filter(DocumentPage.document_id.in_(document_ids)).delete(synchronize_session=False)
+    DocumentDate.query.filter(DocumentDate.document_id.in_(document_ids)).delete(synchronize_session=False)
+    Job.query.filter(Job.document_id.in_(document_ids)).delete(synchronize_session=False)
+    Document.query.filter(Document.id.in_(document_ids)).delete(synchronize_session=False)
     db.session.commit()
-    flash('База данных синхронизирована с файлами в папке uploads.')
-    return redirect(url_for('document_registry'))
 
 
 # Список загруженных файлов
@@ -399,6 +1872,69 @@ def list_files():
     return render_template('list_files.html', files=files)
 
 
+# Синхронизация с папкой uploads из командной строки: flask sync-files
+@app.cli.command('sync-files')
+def sync_files_command():
+    added, changed, removed = sync_upload_folder()
+    print(f'Новых файлов: {added}, изменённых: {changed}, удалённых: {removed}')
+
+
+# Запуск пула обработчиков фоновых задач: flask worker --processes 4
+@app.cli.command('worker')
+@click.option('--processes', type=int, default=None, help='Число процессов-обработчиков.')
+@click.option('--poll-interval', type=float, default=1.0, help='Пауза между опросами пустой очереди, с.')
+def worker_command(processes, poll_interval):
+    job_queue.run_pool(app, processes or app.config['JOB_WORKERS'], poll_interval)
+
+
+# Пакетный анализ из командной строки: flask analyze-all --missing-summary --processes 4
+@app.cli.command('analyze-all')
+@click.option('--ids', default='', help='Номера документов через запятую (по умолчанию все).')
+@click.option('--missing-summary', is_flag=True, help='Только документы без резюме.')
+@click.option('--chunk-size', type=int, default=None, help='Документов в одной задаче.')
+@click.option('--processes', type=int, default=0, help='Сразу обработать пакет в N процессах.')
+def analyze_all_command(ids, missing_summary, chunk_size, processes):
+    query = db.session.query(Document.id).order_by(Document.id)
+    ids = [int(value) for value in ids.split(',') if value.strip().isdigit()]
+    if ids:
+        query = query.filter(Document.id.in_(ids))
+    if missing_summary:
+        query = query.filter(Document.summary.is_(None))
+    batch = create_analysis_batch([row.id for row in query], 'flask analyze-all', chunk_size)
+    print(f'Пакет {batch.id}: документов {batch.total}')
+    if not processes:
+        print(f'Задачи в очереди, ход: /analyze_batch/{batch.id}')
+        return
+
+    started = time.perf_counter()
+    job_queue.run_pool(app, processes, exit_when_idle=True)
+    db.session.expire_all()
+    batch = db.session.get(AnalysisBatch, batch.id)
+    elapsed = time.perf_counter() - started
+    print(f'Готово: {batch.done}, с ошибкой: {batch.failed}, осталось: {batch.total - batch.done - batch.failed}, '
+          f'{elapsed:.1f} с ({batch.done / elapsed if elapsed else 0:.2f} док./с)')
+    for name, values in batch_timings(batch.id).items():
+        if values['avg'] is not None:
+            print(f'  {name}: в среднем {values["avg"]:.2f} с, максимум {values["max"]:.2f} с')
+
+
+# Перестроение полнотекстового индекса: flask search-reindex
+@app.cli.command('search-reindex')
+def search_reindex_command():
+    if not search.is_supported(db.session):
+        raise click.ClickException('Полнотекстовый поиск доступен только для базы данных SQLite.')
+    search.create_index(db.session)
+    count = search.reindex_all(db.session, progress=lambda done, total: print(f'Проиндексировано {done} из {total}'))
+    print(f'Индекс перестроен, документов: {count}')
+
+
+# Статистика кэша извлечённого текста
+@app.route('/text_cache/stats')
+@login_required
+def text_cache_stats():
+    return jsonify(text_cache.stats())
+
+
 # Выход пользователя
 @app.route('/logout')
 @login_required
@@ -417,6 +1953,6 @@ if __name__ == '__main__':
     os.makedirs(app.config['SUMMARY_FOLDER'], exist_ok=True)
 
     with app.app_context():
-        db.create_all()
+        upgrade()  # Применяем миграции, данные не удаляются
 
     app.run(debug=True)
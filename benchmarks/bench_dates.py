@@ -0,0 +1,103 @@
+"""Сравнение скорости и результатов поиска дат: прежняя реализация из app.py и date_extract.
+
+Запуск из корня проекта:
+    python benchmarks/bench_dates.py [файлы.pdf ...] [--repeat 20]
+
+По умолчанию берутся все PDF из папки uploads. Кроме них проверяется
+синтетический текст с большим количеством чисел (таблицы, номера страниц).
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import date_extract  # noqa: E402
+import pdf_extract  # noqa: E402
+
+
+# Прежняя реализация (find_dates_in_text и filter_and_format_dates из app.py)
+def legacy_find_dates_in_text(text):
+    date_pattern = r'\b(?:\d{1,2}[./-])?(?:\d{1,2}[./-])?(?:\d{2,4})\b'
+    return re.findall(date_pattern, text)
+
+
+def legacy_filter_and_format_dates(dates):
+    valid_dates = []
+    for date_str in dates:
+        for fmt in ('%d-%m-%Y', '%d.%m.%Y', '%Y', '%m-%Y', '%Y-%m-%d'):
+            try:
+                valid_dates.append(datetime.strptime(date_str, fmt))
+                break
+            except ValueError:
+                continue
+    return valid_dates
+
+
+def legacy(text):
+    return legacy_filter_and_format_dates(legacy_find_dates_in_text(text))
+
+
+def current(text):
+    return date_extract.extract_dates(text)
+
+
+def number_heavy_text(lines=20000, seed=1):
+    generator = random.Random(seed)
+    months = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня']
+    parts = []
+    for number in range(lines):
+        parts.append(
+            f'{number + 1}. Позиция {generator.randint(1, 9999)} шт. по {generator.randint(10, 99999)}.{generator.randint(0, 99):02d} руб.'
+        )
+        if number % 50 == 0:
+            parts.append(f'Поставка от {generator.randint(1, 28)} {generator.choice(months)} {generator.randint(2000, 2030)} г.')
+            parts.append(f'Акт от {generator.randint(1, 28):02d}.{generator.randint(1, 12):02d}.{generator.randint(2000, 2030)}')
+        if number % 40 == 0:
+            parts.append(f'Страница {number // 40 + 1}')
+    return '\n'.join(parts)
+
+
+def measure(func, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    files = args.files or sorted(glob.glob(os.path.join(root, 'uploads', '*.pdf')))
+    samples = [(os.path.basename(path), pdf_extract.extract_text(path).text) for path in files]
+    samples.append(('synthetic (числа)', number_heavy_text()))
+
+    print(f'{"текст":<40} {"символов":>10} {"прежний, мс":>12} {"дат":>6} {"новый, мс":>10} {"дат":>6} {"ускорение":>10}')
+    total_legacy = total_current = 0.0
+    for name, text in samples:
+        legacy_time, legacy_dates = measure(legacy, text, args.repeat)
+        current_time, current_dates = measure(current, text, args.repeat)
+        total_legacy += legacy_time
+        total_current += current_time
+        print(
+            f'{name[:40]:<40} {len(text):>10} {legacy_time * 1000:>12.2f} {len(legacy_dates):>6} '
+            f'{current_time * 1000:>10.2f} {len(current_dates):>6} {legacy_time / max(current_time, 1e-9):>9.1f}x'
+        )
+    print(f'{"итого":<40} {"":>10} {total_legacy * 1000:>12.2f} {"":>6} {total_current * 1000:>10.2f} {"":>6} '
+          f'{total_legacy / max(total_current, 1e-9):>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Время импорта приложения и модулей, которые оно загружает при первом использовании.
+
+Запуск из корня проекта:
+    python benchmarks/bench_import.py [--repeat 5]
+
+Каждый замер выполняется в новом процессе интерпретатора. Строка «app + warmup»
+показывает, сколько стоит загрузка всех библиотек заранее (gunicorn --preload).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ('app', 'import app'),
+    ('app + warmup', 'import app; app.warmup()'),
+    ('flask + flask_sqlalchemy', 'import flask, flask_sqlalchemy'),
+    ('sklearn (TF-IDF)', 'import sklearn.feature_extraction.text'),
+    ('scipy.sparse', 'import scipy.sparse'),
+    ('PyPDF2', 'import PyPDF2'),
+    ('openai', 'import openai'),
+]
+
+TIMER = 'import time; _start = time.perf_counter(); {statement}; print(time.perf_counter() - _start)'
+
+
+def measure(statement, repeat):
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', TIMER.format(statement=statement)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return min(times), sorted(times)[len(times) // 2]
+
+
+def slowest_imports(statement, limit):
+    # Разбор вывода python -X importtime: модули с наибольшим собственным временем загрузки
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('   ') and not name.startswith('    '):  # Модули, импортированные приложением напрямую
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f'{"что импортируется":<28} {"мин., мс":>10} {"медиана, мс":>12}')
+    for name, statement in CASES:
+        best, median = measure(statement, args.repeat)
+        print(f'{name:<28} {best * 1000:>10.1f} {median * 1000:>12.1f}')
+
+    print('\nСамые медленные прямые импорты app:')
+    for cumulative, name in slowest_imports('import app', args.top):
+        print(f'  {name:<40} {cumulative / 1000:>8.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Нагрузочный тест: параллельные загрузки и анализ документов на разных базах данных.
+
+Запуск из корня проекта:
+    python benchmarks/load_test.py [--processes 4] [--operations 10] [--database-url URL ...]
+
+Каждый процесс — отдельный экземпляр приложения (как воркер gunicorn), который
+загружает PDF из uploads под новым именем и сразу запускает его анализ. Задачи
+выполняются прямо в запросе (JOBS_INLINE=1), обращение к OpenAI заменено заглушкой,
+поэтому измеряется работа с файлами и базой данных.
+
+По умолчанию проверяются SQLite в режиме WAL и SQLite с журналом DELETE (прежний
+режим). PostgreSQL проверяется, если передан --database-url postgresql://..., задана
+переменная LOAD_TEST_POSTGRES_URL или в PATH есть initdb и pg_ctl — тогда на время
+теста запускается временный локальный кластер.
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_app(env):
+    os.environ.update(env)
+    sys.stdout = open(os.devnull, 'w')  # Приложение печатает ход анализа, в отчёте он не нужен
+    sys.path.insert(0, ROOT)
+    import app as application
+
+    async def complete(messages):
+        return 'Резюме для нагрузочного теста.'
+    application.document_summarizer.complete = complete
+    return application
+
+
+def _setup(env):
+    application = _load_app(env)
+    sys.stderr = sys.stdout  # Журнал миграций Alembic
+    from flask_migrate import upgrade
+    from werkzeug.security import generate_password_hash
+    with application.app.app_context():
+        upgrade()
+        if not application.User.query.filter_by(username='load').first():
+            application.db.session.add(application.User(username='load', password=generate_password_hash('load')))
+            application.db.session.commit()
+
+
+def _report(env, queue):
+    application = _load_app(env)
+    with application.app.app_context():
+        Job = application.Job
+        statuses = dict(application.db.session.query(Job.status, application.db.func.count()).group_by(Job.status).all())
+        locked = Job.query.filter(Job.error.like('%locked%')).count()
+    queue.put({'jobs': statuses, 'locked_jobs': locked})
+
+
+def _worker(env, number, operations, samples, barrier, queue):
+    application = _load_app(env)
+    client = application.app.test_client()
+    client.post('/login', data={'username': 'load', 'password': 'load'})
+    latencies = []
+    errors = []
+    barrier.wait()
+    for operation in range(operations):
+        sample = samples[operation % len(samples)]
+        filename = f'load-{number}-{operation}.pdf'
+        with open(sample, 'rb') as file:
+            # Уникальный хвост, чтобы файл не считался точной копией уже загруженного
+            data = file.read() + f'\n%{number}-{operation}\n'.encode()
+        start = time.perf_counter()
+        try:
+            response = client.post(
+                '/upload', data={'document': (io.BytesIO(data), filename)}, content_type='multipart/form-data'
+            )
+            if response.status_code >= 500:
+                errors.append(f'upload {response.status_code}')
+            response = client.get(f'/analyze/{filename}')
+            if response.status_code >= 500:
+                errors.append(f'analyze {response.status_code}')
+        except Exception as e:  # Ошибка базы данных в запросе — тоже результат теста
+            errors.append(f'{type(e).__name__}: {e}'[:200])
+        latencies.append(time.perf_counter() - start)
+    queue.put({'latencies': latencies, 'errors': errors})
+
+
+def run_backend(name, database_url, args, samples, extra_env=None):
+    workdir = tempfile.mkdtemp(prefix='analyzer-load-')
+    try:
+        env = {
+            'DATABASE_URL': database_url.replace('{workdir}', workdir),
+            'UPLOAD_FOLDER': os.path.join(workdir, 'uploads/'),
+            'SUMMARY_FOLDER': os.path.join(workdir, 'summaries/'),
+            'CACHE_FOLDER': os.path.join(workdir, 'cache/'),
+            'JOBS_INLINE': '1',
+            'PDF_EXTRACT_WORKERS': '1',
+            'DB_POOL_SIZE': str(args.pool_size),
+        }
+        env.update(extra_env or {})
+        os.makedirs(env['UPLOAD_FOLDER'])
+        context = multiprocessing.get_context('spawn')  # Каждый процесс импортирует приложение заново
+
+        setup = context.Process(target=_setup, args=(env,))
+        setup.start()
+        setup.join()
+        if setup.exitcode != 0:
+            print(f'{name}: не удалось подготовить базу данных')
+            return
+
+        barrier = context.Barrier(args.processes + 1)
+        queue = context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(env, number, args.operations, samples, barrier, queue))
+            for number in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        results = [queue.get() for _ in workers]
+        elapsed = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+
+        report = context.Process(target=_report, args=(env, queue))
+        report.start()
+        jobs = queue.get()
+        report.join()
+
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+        errors = [error for result in results for error in result['errors']]
+        print(
+            f'{name:<24} {len(latencies) / elapsed:>10.2f} {_percentile(latencies, 50) * 1000:>10.0f} '
+            f'{_percentile(latencies, 95) * 1000:>10.0f} {len(errors):>8} {jobs["locked_jobs"]:>10}  {jobs["jobs"]}'
+        )
+        for error in sorted(set(errors))[:5]:
+            print(f'    {error}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+class LocalPostgres:
+    """Временный кластер PostgreSQL в каталоге tmp (нужны initdb и pg_ctl в PATH)."""
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='analyzer-pg-')
+        self.port = _free_port()
+
+    def __enter__(self):
+        data = os.path.join(self.directory, 'data')
+        subprocess.run(['initdb', '-D', data, '-U', 'postgres', '--auth', 'trust'], check=True, capture_output=True)
+        subprocess.run(
+            ['pg_ctl', '-D', data, '-w', '-l', os.path.join(self.directory, 'log'),
+             '-o', f"-p {self.port} -k {self.directory} -c listen_addresses=''", 'start'],
+            check=True, capture_output=True,
+        )
+        return f'postgresql://postgres@/postgres?host={self.directory}&port={self.port}'
+
+    def __exit__(self, *exc_info):
+        subprocess.run(['pg_ctl', '-D', os.path.join(self.directory, 'data'), '-m', 'fast', 'stop'], capture_output=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _postgres_driver_available():
+    try:
+        import psycopg2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--operations', type=int, default=10, help='Загрузок с анализом на процесс.')
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--database-url', action='append', default=[], help='Дополнительная база данных для проверки.')
+    parser.add_argument('--no-local-postgres', action='store_true')
+    args = parser.parse_args()
+
+    samples = sorted(glob.glob(os.path.join(ROOT, 'uploads', '*.pdf')))
+    if not samples:
+        parser.error('В папке uploads нет PDF-файлов для теста.')
+
+    print(f'Процессов: {args.processes}, операций на процесс: {args.operations}')
+    print(f'{"база данных":<24} {"опер./с":>10} {"p50, мс":>10} {"p95, мс":>10} {"ошибок":>8} {"locked":>10}  задачи')
+    run_backend('sqlite (WAL)', 'sqlite:///{workdir}/load.db', args, samples)
+    run_backend('sqlite (DELETE)', 'sqlite:///{workdir}/load.db', args, samples,
+                {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL'})
+
+    postgres_urls = list(args.database_url)
+    if os.getenv('LOAD_TEST_POSTGRES_URL'):
+        postgres_urls.append(os.getenv('LOAD_TEST_POSTGRES_URL'))
+    for url in postgres_urls:
+        run_backend(url.split('://')[0], url, args, samples)
+
+    if not postgres_urls and not args.no_local_postgres:
+        if not (shutil.which('initdb') and shutil.which('pg_ctl')):
+            print('postgresql: пропущено (нет initdb/pg_ctl; можно передать --database-url)')
+        elif not _postgres_driver_available():
+            print('postgresql: пропущено (не установлен psycopg2)')
+        else:
+            with LocalPostgres() as url:
+                run_backend('postgresql (локальный)', url, args, samples)
+
+
+if __name__ == '__main__':
+    main()
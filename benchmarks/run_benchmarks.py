@@ -0,0 +1,227 @@
+"""Набор бенчмарков основных путей приложения с выводом в JSON для поиска регрессий.
+
+Запуск из корня проекта:
+    python benchmarks/run_benchmarks.py [--documents 8] [--pages 20] [--repeat 5]
+        [--output results.json] [--compare baseline.json] [--threshold 0.25] [--only имя ...]
+
+Корпус синтетических PDF на русском (benchmarks/synthetic_corpus.py) создаётся во
+временной папке вместе с базой SQLite, поэтому рабочие uploads и users.db не
+затрагиваются. Запросы к OpenAI заменены заглушкой, задачи выполняются прямо в
+запросе (JOBS_INLINE=1).
+
+Для каждого бенчмарка сохраняются медиана, минимум, максимум и время первого
+запуска (холодный кэш). С --compare медианы сравниваются с сохранённым ранее
+результатом: замедление больше порога считается регрессией, и скрипт
+завершается с кодом 1 — его можно вызывать в CI.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic_corpus  # noqa: E402  (лежит рядом со скриптом)
+
+
+def load_app(workdir):
+    """Импортирует приложение с папками и базой во временном каталоге."""
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{workdir}/bench.db',
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads/'),
+        'SUMMARY_FOLDER': os.path.join(workdir, 'summaries/'),
+        'CACHE_FOLDER': os.path.join(workdir, 'cache/'),
+        'JOBS_INLINE': '1',
+    })
+    os.makedirs(os.environ['UPLOAD_FOLDER'], exist_ok=True)
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Приложение печатает ход анализа
+    try:
+        import app as application
+        from flask_migrate import upgrade
+        from werkzeug.security import generate_password_hash
+
+        async def complete(messages):
+            return 'Резюме для бенчмарка.'
+        application.document_summarizer.complete = complete
+
+        with application.app.app_context():
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            application.db.session.add(application.User(username='bench', password=generate_password_hash('bench')))
+            application.db.session.commit()
+    finally:
+        sys.stdout = stdout
+    return application
+
+
+class Suite:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def run(self, name, func, repeat=None, setup=None):
+        """Замеряет func() repeat раз; setup(номер запуска) выполняется вне замера.
+        Возвращает False, если бенчмарк исключён параметром --only."""
+        if self.only and not any(pattern in name for pattern in self.only):
+            return False
+        times = []
+        for number in range(repeat or self.repeat):
+            argument = setup(number) if setup else None
+            start = time.perf_counter()
+            func(argument) if setup else func()
+            times.append(time.perf_counter() - start)
+        self.results[name] = {
+            'median': statistics.median(times),
+            'min': min(times),
+            'max': max(times),
+            'first': times[0],
+            'repeat': len(times),
+        }
+        print(f'{name:<36} {self.results[name]["median"] * 1000:>10.2f} {min(times) * 1000:>10.2f} '
+              f'{times[0] * 1000:>10.2f}')
+        return True
+
+
+def run_suite(args, workdir):
+    corpus = synthetic_corpus.generate_corpus(
+        os.path.join(workdir, 'corpus'), args.documents, args.pages, seed=args.seed
+    )
+    application = load_app(workdir)
+    app = application.app
+    suite = Suite(args.repeat, args.only)
+    print(f'{"бенчмарк":<36} {"медиана, мс":>10} {"мин., мс":>10} {"первый, мс":>10}')
+
+    # Функции обработки текста
+    import date_extract
+    import pdf_extract
+    texts = [pdf_extract.extract_text(path, workers=1).text for path in corpus[:2]]
+    pages = [pdf_extract.extract_text(corpus[0], workers=1).text]
+    with app.app_context():
+        suite.run('extract_text_from_pdf', lambda: application.extract_text_from_pdf(corpus[0]))
+        suite.run('calculate_similarity', lambda: application.calculate_similarity(*texts))
+        suite.run('highlight_common_words', lambda: application.highlight_common_words(*texts))
+        # Прежние find_dates_in_text и filter_and_format_dates заменены модулем date_extract
+        suite.run('date_extract.iter_page_dates', lambda: list(date_extract.iter_page_dates(pages)))
+
+    # Маршруты через тестовый клиент
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    uploads = [open(path, 'rb').read() for path in corpus]
+
+    def upload(number):
+        # Уникальный хвост: иначе файл считается копией уже загруженного и не разбирается
+        data = uploads[number % len(uploads)] + f'\n%bench-{number}\n'.encode()
+        return io.BytesIO(data), f'bench_{number:04d}.pdf'
+
+    def post_upload(document):
+        response = client.post('/upload', data={'document': document}, content_type='multipart/form-data')
+        assert response.status_code < 400, response.status_code
+
+    upload_count = max(args.repeat, args.documents)
+    if not suite.run('route: upload (с извлечением текста)', post_upload, repeat=upload_count, setup=upload):
+        for number in range(upload_count):  # Остальным маршрутам нужны загруженные файлы
+            post_upload(upload(number))
+
+    def compare_pair(number):
+        return f'/compare_files?file1=bench_{number:04d}.pdf&file2=bench_{number + 1:04d}.pdf'
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    # Каждый запуск — новая пара файлов (без кэша сравнений), затем одна пара повторно
+    suite.run('route: compare_files', get, repeat=min(args.repeat, max(args.documents - 1, 1)), setup=compare_pair)
+    suite.run('route: compare_files (кэш)', lambda: get(compare_pair(0)))
+    suite.run('route: compare_files, стр. 2', lambda: get(compare_pair(0) + '&page=2'))
+    suite.run('route: compare_hunks_api', lambda: get(
+        compare_pair(0).replace('/compare_files', '/api/compare/hunks') + '&offset=0&limit=40'
+    ))
+    suite.run('route: document_registry', lambda: get('/documents'))
+    suite.run('route: document_registry, фильтр', lambda: get('/documents?q=bench_00&has_summary=0'))
+    return suite.results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Печатает сравнение медиан и возвращает список регрессий."""
+    regressions = []
+    print(f'\n{"бенчмарк":<36} {"было, мс":>10} {"стало, мс":>10} {"изменение":>10}')
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        ratio = result['median'] / max(previous['median'], 1e-9)
+        mark = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = '  РЕГРЕССИЯ'
+        print(f'{name:<36} {previous["median"] * 1000:>10.2f} {result["median"] * 1000:>10.2f} '
+              f'{(ratio - 1) * 100:>+9.0f}%{mark}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=8, help='Документов в синтетическом корпусе.')
+    parser.add_argument('--pages', type=int, default=20, help='Страниц в каждом документе.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Файл для результатов в JSON.')
+    parser.add_argument('--compare', help='Результаты прежнего запуска (JSON) для сравнения.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Допустимое замедление медианы (0.25 = 25%%).')
+    parser.add_argument('--only', nargs='*', help='Запустить только бенчмарки, в имени которых есть эти строки.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='analyzer-bench-')
+    try:
+        results = run_suite(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {'documents': args.documents, 'pages': args.pages, 'seed': args.seed, 'repeat': args.repeat},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('meta', {}).get('params') != report['meta']['params']:
+            print('Внимание: параметры корпуса отличаются от сравниваемого запуска.')
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'Регрессии: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Генератор синтетических PDF на русском языке для бенчмарков.
+
+Запуск из корня проекта:
+    python benchmarks/synthetic_corpus.py ПАПКА [--documents 20] [--pages 10] [--seed 1]
+
+PDF собирается вручную, без сторонних библиотек: стандартный шрифт Helvetica с
+кодировкой /Differences, где байтам 128–193 сопоставлены кириллические глифы
+(afii10017…). PyPDF2 по этим именам восстанавливает Unicode, поэтому извлечённый
+текст — настоящий русский текст. Просмотрщики PDF кириллицу в Helvetica не
+отрисуют, но для измерения скорости это не важно.
+
+Документы собираются из общего набора абзацев, поэтому между ними есть
+пересечения (как у редакций одного договора), а в тексте встречаются даты
+в разных форматах, номера пунктов и суммы — то, на чём работают поиск дат и
+сравнение файлов.
+"""
+import argparse
+import os
+import random
+
+# Кириллица: заглавные А–Я (с Ё) — afii10017…afii10049, строчные — afii10065…afii10097
+_UPPER = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+_LOWER = _UPPER.lower()
+_FIRST_CODE = 128
+_GLYPHS = [f'afii{10017 + number}' for number in range(len(_UPPER))] + \
+          [f'afii{10065 + number}' for number in range(len(_LOWER))]
+_ENCODE = {letter: _FIRST_CODE + number for number, letter in enumerate(_UPPER + _LOWER)}
+
+_WORDS = (
+    'договор стороны обязуются исполнить условия настоящего соглашения в установленный срок '
+    'поставщик покупатель товар оплата счёт акт приёмки работы услуги заказчик исполнитель '
+    'ответственность неустойка претензия порядок расчётов банковские реквизиты уведомление '
+    'дополнительное соглашение приложение спецификация гарантия качество количество цена '
+    'налог сумма рублей копеек период отчётный квартал решение собрание участников общества '
+    'генеральный директор полномочия доверенность протокол согласование изменение расторжение '
+    'форс-мажор обстоятельства арбитражный суд законодательство Российской Федерации Москва '
+    'организация компания проект этап график сроки выполнения передача документации'
+).split()
+
+_MONTHS = ('января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+           'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря')
+
+_LINE_CHARS = 90
+_LINES_PER_PAGE = 50
+
+
+def _random_date(rng):
+    year, month, day = rng.randint(2015, 2025), rng.randint(1, 12), rng.randint(1, 28)
+    return rng.choice((
+        f'{day:02d}.{month:02d}.{year}',
+        f'{day} {_MONTHS[month - 1]} {year} г.',
+        f'{year}-{month:02d}-{day:02d}',
+        f'{year} года',
+    ))
+
+
+def _sentence(rng):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 16))]
+    roll = rng.random()
+    if roll < 0.15:
+        words.insert(rng.randrange(len(words)), 'от ' + _random_date(rng))
+    elif roll < 0.3:
+        words.insert(rng.randrange(len(words)), f'{rng.randint(1000, 999999)} рублей')
+    elif roll < 0.4:
+        words.insert(0, f'{rng.randint(1, 20)}.{rng.randint(1, 9)}.')
+    words[0] = words[0][:1].upper() + words[0][1:]
+    return ' '.join(words) + '.'
+
+
+def paragraph_pool(rng, size=200):
+    return [' '.join(_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(size)]
+
+
+def document_pages(rng, pool, pages):
+    """Страницы документа: абзацы из общего набора, часть — с изменёнными словами."""
+    result = []
+    for _ in range(pages):
+        lines = []
+        while len(lines) < _LINES_PER_PAGE:
+            paragraph = rng.choice(pool)
+            if rng.random() < 0.3:
+                words = paragraph.split()
+                words[rng.randrange(len(words))] = rng.choice(_WORDS)
+                paragraph = ' '.join(words)
+            lines.extend(_wrap(paragraph))
+            lines.append('')
+        result.append(lines[:_LINES_PER_PAGE])
+    return result
+
+
+def _wrap(text):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > _LINE_CHARS:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _encode(line):
+    data = bytearray()
+    for char in line:
+        code = _ENCODE.get(char, ord(char) if 32 <= ord(char) < 127 else ord('?'))
+        if code in (0x28, 0x29, 0x5C):  # ( ) \ в строке PDF экранируются
+            data.append(0x5C)
+        data.append(code)
+    return bytes(data)
+
+
+def build_pdf(pages):
+    """PDF из страниц (списков строк) в виде байтов."""
+    objects = {}
+    page_ids = []
+    next_id = 5  # 1 — каталог, 2 — дерево страниц, 3 — шрифт, 4 — кодировка
+    for lines in pages:
+        stream = b'BT /F1 10 Tf 14 TL 40 800 Td\n' + b''.join(
+            b'(' + _encode(line) + b') Tj T*\n' for line in lines
+        ) + b'ET'
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+        objects[page_id] = (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        page_ids.append(page_id)
+
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids)
+    )
+    objects[3] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding 4 0 R >>'
+    objects[4] = b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences [%d %s] >>' % (
+        _FIRST_CODE, ' '.join('/' + glyph for glyph in _GLYPHS).encode('ascii')
+    )
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += b'%d 0 obj\n' % number + objects[number] + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for number in sorted(objects):
+        output += b'%010d 00000 n \n' % offsets[number]
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def generate_corpus(directory, documents=20, pages=10, seed=1, prefix='synthetic'):
+    """Создаёт documents PDF по pages страниц и возвращает пути к ним."""
+    rng = random.Random(seed)
+    pool = paragraph_pool(rng)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(documents):
+        path = os.path.join(directory, f'{prefix}_{number:04d}.pdf')
+        with open(path, 'wb') as file:
+            file.write(build_pdf(document_pages(rng, pool, pages)))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    paths = generate_corpus(args.directory, args.documents, args.pages, args.seed)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f'Создано файлов: {len(paths)}, страниц в каждом: {args.pages}, объём: {size / 1024 / 1024:.2f} МБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,52 @@
 import os
 
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
+
+def database_url():
+    url = os.getenv('DATABASE_URL', 'sqlite:///users.db')
+    # Heroku и многие хостинги отдают устаревшую схему postgres://, SQLAlchemy её не принимает
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    """Параметры движка SQLAlchemy для выбранной базы данных.
+
+    SQLite: ожидание блокировки вместо ошибки «database is locked» (остальные
+    настройки соединения задаются PRAGMA, см. sqlite_pragmas). PostgreSQL: пул
+    соединений заданного размера с проверкой соединения перед выдачей.
+    """
+    if url.startswith('sqlite'):
+        return {'connect_args': {'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 30000)) / 1000}}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas():
+    # WAL: читатели не блокируют писателя, а писатель — читателей;
+    # synchronous=NORMAL в режиме WAL безопасен и заметно ускоряет фиксацию транзакций
+    return {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 30000)),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 64 * 1024)),  # Отрицательное значение — в килобайтах
+        'temp_store': 'MEMORY',
+        'mmap_size': int(os.getenv('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)),
+    }
+
+
 class Config:
-    SECRET_KEY = 'your_secret_key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///users.db'
+    SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = 'uploads/'
-    SUMMARY_FOLDER = 'summaries/'
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(base_dir, 'uploads/'))
+    SUMMARY_FOLDER = os.getenv('SUMMARY_FOLDER', os.path.join(base_dir, 'summaries/'))
+    CACHE_FOLDER = os.getenv('CACHE_FOLDER', os.path.join(base_dir, 'cache/'))
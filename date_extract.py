@@ -0,0 +1,100 @@
+import re
+from collections import namedtuple
+from datetime import date
+
+
+# Найденная дата: value — datetime.date (для неполных дат первое число месяца или года),
+# start и end — позиции в тексте, precision — 'day', 'month' или 'year'
+FoundDate = namedtuple('FoundDate', 'value start end text precision')
+
+DAY = 'day'
+MONTH = 'month'
+YEAR = 'year'
+
+_MONTH_STEMS = (
+    'январ', 'феврал', 'март', 'апрел', 'ма', 'июн',
+    'июл', 'август', 'сентябр', 'октябр', 'ноябр', 'декабр',
+)
+# Формы месяца: «12 марта», «март 2023», «в марте 2023», «мая»
+_MONTH_GENITIVE = '|'.join(
+    ('мая' if stem == 'ма' else stem + ('а' if stem in ('март', 'август') else 'я'))
+    for stem in _MONTH_STEMS
+)
+_MONTH_ANY = '|'.join(
+    ('ма[йяе]' if stem == 'ма' else stem + ('(?:а|е)?' if stem in ('март', 'август') else '[ьяе]'))
+    for stem in _MONTH_STEMS
+)
+
+_YEAR = r'(?:1\d|2\d)\d\d'
+_YEAR_SUFFIX = r'(?:\s*(?:г\.|гг\.|года?\b))'
+
+# Один проход по тексту: все форматы объединены в одно выражение с именованными группами.
+# Более длинные форматы стоят раньше, чтобы «12 марта 2023 г.» не нашлось как «марта 2023».
+DATE_RE = re.compile(
+    r'(?<![\w.\-/])(?:'
+    # 2023-03-12
+    rf'(?P<iso_y>{_YEAR})-(?P<iso_m>\d{{2}})-(?P<iso_d>\d{{2}})'
+    # 12.03.2023, 12/03/2023, 12-03-2023
+    rf'|(?P<num_d>\d{{1,2}})(?P<sep>[./\-])(?P<num_m>\d{{1,2}})(?P=sep)(?P<num_y>{_YEAR})'
+    # 03.2023, 03/2023, 03-2023 (месяц всегда двумя цифрами)
+    rf'|(?P<nm_m>\d{{2}})[./\-](?P<nm_y>{_YEAR}){_YEAR_SUFFIX}?'
+    # 12 марта 2023 г.
+    rf'|(?P<txt_d>\d{{1,2}})\s+(?P<txt_m>{_MONTH_GENITIVE})\s+(?P<txt_y>{_YEAR}){_YEAR_SUFFIX}?'
+    # март 2023 года, в марте 2023 г.
+    rf'|(?P<my_m>{_MONTH_ANY})\s+(?P<my_y>{_YEAR}){_YEAR_SUFFIX}?'
+    # 2023 г., 2023 года (год без явного указателя не считается датой)
+    rf'|(?P<year>{_YEAR}){_YEAR_SUFFIX}'
+    r')(?![\w\-/]|\.\d)',
+    re.IGNORECASE,
+)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _month_number(name):
+    name = name.lower()
+    for number, stem in enumerate(_MONTH_STEMS, start=1):
+        if name.startswith(stem) and (stem != 'ма' or len(name) == 3):
+            return number
+    return None
+
+
+def _is_valid(year, month, day, min_year, max_year):
+    if not (min_year <= year <= max_year and 1 <= month <= 12 and day >= 1):
+        return False
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return day <= 29
+    return day <= _DAYS_IN_MONTH[month - 1]
+
+
+def iter_dates(text, min_year=1900, max_year=2100):
+    """Даты в тексте по порядку. Дата собирается из чисел напрямую,
+    некорректные значения (31.02, 13-й месяц, годы вне диапазона) пропускаются."""
+    for match in DATE_RE.finditer(text):
+        groups = match.groupdict()
+        if groups['iso_y']:
+            year, month, day, precision = int(groups['iso_y']), int(groups['iso_m']), int(groups['iso_d']), DAY
+        elif groups['num_y']:
+            year, month, day, precision = int(groups['num_y']), int(groups['num_m']), int(groups['num_d']), DAY
+        elif groups['nm_y']:
+            year, month, day, precision = int(groups['nm_y']), int(groups['nm_m']), 1, MONTH
+        elif groups['txt_y']:
+            year, month, day, precision = int(groups['txt_y']), _month_number(groups['txt_m']), int(groups['txt_d']), DAY
+        elif groups['my_y']:
+            year, month, day, precision = int(groups['my_y']), _month_number(groups['my_m']), 1, MONTH
+        else:
+            year, month, day, precision = int(groups['year']), 1, 1, YEAR
+        if month is None or not _is_valid(year, month, day, min_year, max_year):
+            continue
+        yield FoundDate(date(year, month, day), match.start(), match.end(), match.group(0), precision)
+
+
+def extract_dates(text, min_year=1900, max_year=2100):
+    return list(iter_dates(text, min_year, max_year))
+
+
+def iter_page_dates(pages, min_year=1900, max_year=2100):
+    """Пары (номер страницы с 1, дата) для текста, переданного по страницам."""
+    for number, page in enumerate(pages, start=1):
+        for found in iter_dates(page, min_year, max_year):
+            yield number, found
@@ -0,0 +1,23 @@
+import os
+
+# gunicorn -c gunicorn.conf.py app:app
+# GUNICORN_PRELOAD=1: приложение и тяжёлые библиотеки загружаются один раз в
+# мастер-процессе, воркеры получают их через fork и стартуют сразу.
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+
+def when_ready(server):
+    if preload_app:
+        from app import warmup
+        warmup()
+        server.log.info('Библиотеки загружены до запуска воркеров')
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Соединения с базой, открытые в мастер-процессе, воркерам не передаются
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose()
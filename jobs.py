@@ -0,0 +1,141 @@
+import multiprocessing
+import signal
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta
+
+
+# Статусы задач в очереди
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """Очередь фоновых задач поверх таблицы в базе данных.
+
+    Задачи забирает пул процессов-обработчиков (`flask worker`). Захват задачи
+    выполняется условным UPDATE, поэтому несколько процессов не возьмут одну и
+    ту же задачу. Упавшая задача возвращается в очередь с задержкой, пока не
+    исчерпано число попыток.
+    """
+
+    def __init__(self, db, model, retry_delay=30, stale_after=600):
+        self.db = db
+        self.model = model
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.handlers = {}
+
+    def handler(self, kind):
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def enqueue(self, kind, commit=True, **fields):
+        job = self.model(kind=kind, status=PENDING, **fields)
+        self.db.session.add(job)
+        if commit:
+            self.db.session.commit()
+        return job
+
+    def set_progress(self, job, progress):
+        job.progress = progress
+        job.updated_at = datetime.utcnow()
+        self.db.session.commit()
+
+    def claim_next(self):
+        Job = self.model
+        session = self.db.session
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.stale_after)
+        ready = self.db.or_(
+            self.db.and_(Job.status == PENDING, Job.run_after <= now),
+            # Задачи процесса, который умер, не завершив их
+            self.db.and_(Job.status == RUNNING, Job.updated_at < stale_before),
+        )
+        for _ in range(5):
+            candidate = session.query(Job.id, Job.status).filter(ready).order_by(Job.id).first()
+            if candidate is None:
+                return None
+            claimed = session.query(Job).filter(
+                Job.id == candidate.id, Job.status == candidate.status
+            ).filter(ready).update(
+                {'status': RUNNING, 'attempts': Job.attempts + 1, 'updated_at': now},
+                synchronize_session=False,
+            )
+            session.commit()
+            if claimed:
+                return session.get(Job, candidate.id)
+        return None
+
+    def run_job(self, job):
+        session = self.db.session
+        try:
+            self.handlers[job.kind](job)
+        except Exception as e:
+            session.rollback()
+            job = session.get(self.model, job.id)
+            job.error = f'{e}\n{traceback.format_exc()}'
+            if job.attempts < job.max_attempts:
+                job.status = PENDING
+                job.run_after = datetime.utcnow() + timedelta(seconds=self.retry_delay * job.attempts)
+            else:
+                job.status = FAILED
+            print(f'Ошибка при выполнении задачи {job.id} ({job.kind}): {e}')
+        else:
+            job.status = DONE
+            job.progress = 100
+            job.error = None
+        job.updated_at = datetime.utcnow()
+        session.commit()
+
+    def run_inline(self, job):
+        # Выполнение задачи прямо в текущем процессе (режим отладки без `flask worker`)
+        job.status = RUNNING
+        job.attempts += 1
+        job.updated_at = datetime.utcnow()
+        self.db.session.commit()
+        self.run_job(job)
+
+    def run_worker(self, app, poll_interval=1.0, exit_when_idle=False):
+        # exit_when_idle: завершиться, когда в очереди не останется готовых задач (разовая обработка)
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        with app.app_context():
+            # Соединения, унаследованные от родительского процесса, использовать нельзя
+            self.db.engine.dispose()
+            while not stopping:
+                job = self.claim_next()
+                if job is None:
+                    if exit_when_idle:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                self.run_job(job)
+                self.db.session.remove()
+
+    def run_pool(self, app, processes, poll_interval=1.0, exit_when_idle=False):
+        context = multiprocessing.get_context('fork')
+        workers = [
+            # Не daemon: обработчикам нужен собственный пул процессов для разбора PDF
+            context.Process(target=self.run_worker, args=(app, poll_interval, exit_when_idle))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        # При остановке родителя завершаем и обработчиков
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
@@ -0,0 +1,303 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: там приложение запускается одним процессом
+    fcntl = None
+
+
+# Границы корзин гистограмм в секундах: от быстрых запросов до долгих вызовов LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Накопленные значения завершившихся процессов
+TOTAL_FILE = 'total.json'
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: счётчики по корзинам, сумма и число наблюдений
+    для каждого набора значений меток."""
+
+    def __init__(self, registry, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # метки -> [счётчики корзин..., +Inf, сумма, число]
+
+    def observe(self, value, *labels):
+        registry = self.registry
+        with registry.lock:
+            registry.check_pid()
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[bisect_left(self.buckets, value)] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        registry.maybe_flush()
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Декоратор создаёт один замер на функцию: каждому вызову (в том числе из
+        # разных потоков) нужен свой, иначе одновременные вызовы затирают start
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """Набор гистограмм процесса.
+
+    У приложения несколько процессов (воркеры gunicorn, обработчики очереди),
+    а /metrics отдаёт один из них. Поэтому каждый процесс раз в flush_interval
+    секунд сохраняет свои значения в файл <pid>-<время запуска>.json в общей
+    папке, и при выдаче метрик файлы всех процессов суммируются. Время запуска
+    в имени нужно, чтобы новый процесс с тем же pid не затёр файл прежнего.
+
+    Счётчики Prometheus только растут, поэтому значения завершившихся процессов
+    не теряются: при выходе процесс, а для упавших — первый же сбор метрик,
+    добавляет их в total.json и удаляет файл процесса. Так число файлов не
+    превышает числа живых процессов.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.folder = None
+        self.flush_interval = 5.0
+        self.last_flush = 0.0
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+
+    def configure(self, folder, flush_interval=5.0):
+        self.folder = folder
+        self.flush_interval = flush_interval
+
+    def histogram(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(self, name, documentation, labelnames, buckets)
+            return self.metrics[name]
+
+    def check_pid(self):
+        # После fork значения родителя уже учтены в его файле — начинаем с нуля
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.started = time.time_ns()
+            self.last_flush = 0.0
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def snapshot(self):
+        with self.lock:
+            self.check_pid()
+            return {
+                name: [[list(labels), list(entry)] for labels, entry in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def maybe_flush(self):
+        if self.folder and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    @property
+    def filename(self):
+        return f'{self.pid}-{self.started}.json'
+
+    def flush(self):
+        if not self.folder:
+            return
+        self.last_flush = time.monotonic()
+        data = self.snapshot()
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            self._write(os.path.join(self.folder, self.filename), data)
+        except OSError:
+            pass  # Метрики не должны ломать обработку запроса
+
+    def close(self):
+        """Сохраняет значения процесса в total.json перед его завершением."""
+        if not self.folder:
+            return
+        self.flush()
+        self.compact(final=True)
+
+    def compact(self, final=False):
+        """Переносит файлы завершившихся процессов (и свой, если final) в total.json."""
+        if not self.folder or not os.path.isdir(self.folder):
+            return
+        own = self.filename
+        try:
+            with self._locked(exclusive=True):
+                names = [
+                    name for name in os.listdir(self.folder)
+                    if name.endswith('.json') and name != TOTAL_FILE
+                    and (name == own if final else name != own and not _alive(_file_pid(name)))
+                ]
+                if not names:
+                    return
+                snapshots = [self._read(TOTAL_FILE)] + [self._read(name) for name in names]
+                total = _merge(snapshots)
+                self._write(os.path.join(self.folder, TOTAL_FILE), {
+                    name: [[list(labels), entry] for labels, entry in values.items()]
+                    for name, values in total.items()
+                })
+                for name in names:
+                    os.remove(os.path.join(self.folder, name))
+        except OSError:
+            pass
+
+    def collect(self):
+        """Значения всех процессов: {имя: {метки: [корзины..., сумма, число]}}."""
+        snapshots = [self.snapshot()]
+        self.compact()
+        if self.folder and os.path.isdir(self.folder):
+            own = self.filename
+            # Под общей блокировкой: пока файл переносится в total.json, его значения не должны учитываться дважды
+            with self._locked(exclusive=False):
+                for name in os.listdir(self.folder):
+                    if name.endswith('.json') and name != own:
+                        snapshots.append(self._read(name))
+        merged = _merge(snapshots)
+        return {name: merged.get(name, {}) for name in self.metrics}
+
+    @contextmanager
+    def _locked(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.folder, '.lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.folder, name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write(path, data):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+    def render(self):
+        """Текст в формате Prometheus (text/plain; version=0.0.4)."""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, entry in sorted(values.items()):
+                pairs = [f'{key}="{_escape(value)}"' for key, value in zip(metric.labelnames, labels)]
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), entry):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    bucket_labels = ','.join(pairs + [f'le="{le}"'])
+                    lines.append(f'{name}_bucket{{{bucket_labels}}} {cumulative}')
+                suffix = '{' + ','.join(pairs) + '}' if pairs else ''
+                lines.append(f'{name}_sum{suffix} {entry[-2]}')
+                lines.append(f'{name}_count{suffix} {entry[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(snapshots):
+    """Сумма снимков {имя: [[метки, значения], ...]} -> {имя: {метки: значения}}."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, rows in snapshot.items():
+            values = merged.setdefault(name, {})
+            for labels, entry in rows:
+                total = values.get(tuple(labels))
+                if total is None or len(total) != len(entry):
+                    values[tuple(labels)] = list(entry)
+                else:
+                    for position, value in enumerate(entry):
+                        total[position] += value
+    return merged
+
+
+def _file_pid(name):
+    try:
+        return int(name.split('.')[0].split('-')[0])
+    except ValueError:
+        return None
+
+
+def _alive(pid):
+    if pid is None:
+        return True  # Чужой файл не трогаем
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+atexit.register(registry.close)
+
+# Время обработки HTTP-запросов по маршрутам
+REQUEST_SECONDS = registry.histogram(
+    'analyzer_request_seconds', 'Время обработки HTTP-запроса, с.', ['method', 'endpoint', 'status']
+)
+# Время этапов: pdf_extract, tfidf, diff, dates, llm, db_commit
+STAGE_SECONDS = registry.histogram('analyzer_stage_seconds', 'Время этапа обработки документов, с.', ['stage'])
+
+
+def stage(name):
+    """Замер этапа: `with metrics.stage('diff'):` или декоратор `@metrics.stage('diff')`."""
+    return STAGE_SECONDS.time(name)
+
+
+def timed_iter(name, iterable):
+    """Отдаёт элементы iterable и замеряет только время их получения (без работы
+    вызывающего кода между элементами); итог записывается, когда итератор исчерпан."""
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        STAGE_SECONDS.observe(elapsed, name)
@@ -0,0 +1,51 @@
+"""Move document content to document_page
+
+Revision ID: 3b1f6c2d9a47
+Revises: ea43dc6e8a0e
+Create Date: 2026-10-18 18:40:12.512304
+
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f6c2d9a47'
+down_revision = 'ea43dc6e8a0e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Текст документов без постраничного хранения становится их первой страницей
+    op.execute(
+        "INSERT INTO document_page (document_id, page_number, content) "
+        "SELECT d.id, 1, d.content FROM document d "
+        "WHERE d.content != '' AND NOT EXISTS (SELECT 1 FROM document_page p WHERE p.document_id = d.id)"
+    )
+    op.execute(
+        "UPDATE document SET page_count = 1 "
+        "WHERE page_count = 0 AND EXISTS (SELECT 1 FROM document_page p WHERE p.document_id = document.id)"
+    )
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_column('content')
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content', sa.Text(), nullable=False, server_default=''))
+
+    # Текст документа собирается из страниц по порядку, как в get_full_text. Склейка
+    # выполняется здесь, а не в SQL: порядок в group_concat/string_agg в разных СУБД
+    # задаётся по-разному. Страницы читаются потоком, в памяти — только один документ
+    connection = op.get_bind()
+    document = sa.table('document', sa.column('id', sa.Integer), sa.column('content', sa.Text))
+    pages = connection.execution_options(stream_results=True).execute(sa.text(
+        'SELECT document_id, content FROM document_page ORDER BY document_id, page_number'
+    ))
+    for document_id, rows in groupby(pages, key=lambda row: row.document_id):
+        connection.execute(
+            document.update().where(document.c.id == document_id).values(content=''.join(row.content for row in rows))
+        )
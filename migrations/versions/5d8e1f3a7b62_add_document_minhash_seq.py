@@ -0,0 +1,31 @@
+"""Add document minhash_seq
+
+Revision ID: 5d8e1f3a7b62
+Revises: 7c5e2a9d4f18
+Create Date: 2026-10-18 23:10:42.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e1f3a7b62'
+down_revision = '7c5e2a9d4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('minhash_seq', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_document_minhash_seq'), ['minhash_seq'], unique=False)
+
+    # Уже посчитанные сигнатуры нумеруются по id
+    op.execute('UPDATE document SET minhash_seq = id WHERE minhash IS NOT NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_minhash_seq'))
+        batch_op.drop_column('minhash_seq')
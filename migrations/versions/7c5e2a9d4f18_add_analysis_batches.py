@@ -0,0 +1,59 @@
+"""Add analysis batches and job payload
+
+Revision ID: 7c5e2a9d4f18
+Revises: 3b1f6c2d9a47
+Create Date: 2026-10-18 21:40:12.504317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c5e2a9d4f18'
+down_revision = '3b1f6c2d9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('done', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('analysis_batch_item',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('extract_seconds', sa.Float(), nullable=True),
+    sa.Column('summary_seconds', sa.Float(), nullable=True),
+    sa.Column('dates_seconds', sa.Float(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['analysis_batch.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['document_id'], ['document.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('analysis_batch_item', schema=None) as batch_op:
+        batch_op.create_index('ix_analysis_batch_item_batch_status', ['batch_id', 'status'], unique=False)
+
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payload', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_column('payload')
+
+    with op.batch_alter_table('analysis_batch_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_analysis_batch_item_batch_status')
+
+    op.drop_table('analysis_batch_item')
+    op.drop_table('analysis_batch')
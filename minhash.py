@@ -0,0 +1,114 @@
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+
+
+# Простое число больше 2^32: (a * x + b) mod p не переполняет uint64 при a, b < 2^31
+PRIME = 4294967311
+MAX_HASH = (1 << 32) - 1
+
+
+WORD_RE = re.compile(r'\w+')
+
+
+def iter_shingles(pages, size=5):
+    """Шинглы из size подряд идущих слов; окно переходит через границы страниц."""
+    window = []
+    for page in pages:
+        for word in WORD_RE.findall(page.lower()):
+            window.append(word)
+            if len(window) > size:
+                del window[0]
+            if len(window) == size:
+                yield ' '.join(window)
+    if 0 < len(window) < size:  # Текст короче одного шингла
+        yield ' '.join(window)
+
+
+def token_hash(token):
+    if isinstance(token, (int, np.integer)):
+        return int(token) & MAX_HASH
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHasher:
+    """MinHash-сигнатуры множеств строк или целых чисел."""
+
+    def __init__(self, num_perm=128, seed=1):
+        self.num_perm = num_perm
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self.b = generator.randint(0, 1 << 31, num_perm).astype(np.uint64)
+
+    def signature(self, tokens, batch_size=4096):
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        batch = []
+        for token in tokens:
+            batch.append(token_hash(token))
+            if len(batch) == batch_size:
+                self._update(signature, batch)
+                batch = []
+        if batch:
+            self._update(signature, batch)
+        return signature.astype(np.uint32)
+
+    def _update(self, signature, batch):
+        # Перестановки считаются пачкой, чтобы память не зависела от размера множества
+        values = np.array(batch, dtype=np.uint64)[:, None]
+        hashes = (values * self.a + self.b) % np.uint64(PRIME) & np.uint64(MAX_HASH)
+        np.minimum(signature, hashes.min(axis=0), out=signature)
+
+
+def jaccard(signature1, signature2):
+    # Доля совпавших минимумов — оценка коэффициента Жаккара
+    return float(np.mean(signature1 == signature2))
+
+
+def signature_to_bytes(signature):
+    return np.asarray(signature, dtype=np.uint32).tobytes()
+
+
+def signature_from_bytes(blob):
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+class LSHIndex:
+    """LSH по полосам сигнатуры: кандидаты — ключи, совпавшие хотя бы в одной полосе."""
+
+    def __init__(self, num_perm=128, bands=32):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.tables = [defaultdict(set) for _ in range(bands)]
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, signature):
+        if key in self.keys:
+            self.remove(key)
+        band_keys = self._band_keys(signature)
+        for table, band_key in zip(self.tables, band_keys):
+            table[band_key].add(key)
+        self.keys[key] = band_keys
+
+    def remove(self, key):
+        band_keys = self.keys.pop(key, None)
+        if band_keys is None:
+            return
+        for table, band_key in zip(self.tables, band_keys):
+            bucket = table[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del table[band_key]
+
+    def query(self, signature):
+        candidates = set()
+        for table, band_key in zip(self.tables, self._band_keys(signature)):
+            candidates.update(table.get(band_key, ()))
+        return candidates
@@ -0,0 +1,104 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+# Результат извлечения: весь текст и смещения начала каждой страницы в нём
+ExtractedText = namedtuple('ExtractedText', ['text', 'page_offsets'])
+
+_pool = None
+_pool_workers = None
+
+
+def _get_pool(workers):
+    # Пул создаётся один раз на процесс: запуск процессов дороже разбора пары страниц
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def _reader(file):
+    # PyPDF2 импортируется при первом разборе, а не при запуске приложения
+    from PyPDF2 import PdfReader
+    return PdfReader(file)
+
+
+def _extract_range(file_path, start, stop):
+    with open(file_path, 'rb') as file:
+        reader = _reader(file)
+        return [reader.pages[number].extract_text() or '' for number in range(start, stop)]
+
+
+def page_count(file_path):
+    with open(file_path, 'rb') as file:
+        return len(_reader(file).pages)
+
+
+def _split_range(count, workers):
+    # Несколько диапазонов на процесс, чтобы медленные страницы не задерживали весь пул
+    size = max(1, -(-count // (workers * 4)))
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def iter_pages(file_path, workers=None, min_pages=32, ordered=False):
+    """Отдаёт пары (номер страницы, текст) по мере готовности.
+
+    Документы короче min_pages страниц разбираются в текущем процессе, длинные —
+    делятся на диапазоны страниц и разбираются пулом процессов. В работе
+    одновременно не больше двух диапазонов на процесс, поэтому память не растёт,
+    даже если вызывающий код читает страницы медленнее, чем пул их разбирает.
+    При ordered=True страницы отдаются строго по порядку.
+    """
+    workers = workers or os.cpu_count() or 1
+    count = page_count(file_path)
+
+    if workers <= 1 or count < min_pages:
+        with open(file_path, 'rb') as file:
+            reader = _reader(file)
+            for number in range(count):
+                yield number, reader.pages[number].extract_text() or ''
+        return
+
+    pool = _get_pool(workers)
+    ranges = iter(_split_range(count, workers))
+    window = workers * 2
+    running = {}
+    ready = {}
+    next_page = 0
+    while True:
+        # Готовые, но ещё не отданные диапазоны тоже занимают место в окне
+        while len(running) + len(ready) < window:
+            page_range = next(ranges, None)
+            if page_range is None:
+                break
+            running[pool.submit(_extract_range, file_path, *page_range)] = page_range[0]
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            ready[running.pop(future)] = future.result()
+        for start in sorted(ready):
+            if ordered and start != next_page:
+                break
+            pages = ready.pop(start)
+            for offset, text in enumerate(pages):
+                yield start + offset, text
+            next_page = start + len(pages)
+
+
+def extract_text(file_path, workers=None, min_pages=32):
+    pages = [None] * page_count(file_path)
+    for number, text in iter_pages(file_path, workers, min_pages):
+        pages[number] = text
+
+    # Текст склеивается один раз, границы страниц сохраняются смещениями
+    page_offsets = []
+    position = 0
+    for text in pages:
+        page_offsets.append(position)
+        position += len(text)
+    return ExtractedText(''.join(pages), page_offsets)
@@ -0,0 +1,125 @@
+import html
+import re
+
+from sqlalchemy import text
+
+
+# Полнотекстовый индекс SQLite FTS5: строка на каждую страницу документа
+# (page_number от 1) и отдельная строка с резюме (page_number = 0).
+TABLE = 'document_search'
+SUMMARY_PAGE = 0
+
+# Маркеры подсветки в сниппете: заменяются на <mark> после экранирования HTML
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def is_supported(session):
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def create_index(session):
+    session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "title, body, document_id UNINDEXED, page_number UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    session.commit()
+
+
+def remove_document(session, document_id):
+    session.execute(text(f'DELETE FROM {TABLE} WHERE document_id = :id'), {'id': document_id})
+
+
+def index_document(session, document_id):
+    """Переиндексирует документ целиком. Текст копируется в индекс средствами
+    SQLite (INSERT ... SELECT) и в Python не загружается."""
+    remove_document(session, document_id)
+    params = {'id': document_id, 'summary_page': SUMMARY_PAGE}
+    session.execute(text(
+        f"INSERT INTO {TABLE} (title, body, document_id, page_number) "
+        "SELECT d.title, p.content, d.id, p.page_number "
+        "FROM document d JOIN document_page p ON p.document_id = d.id WHERE d.id = :id"
+    ), params)
+    # Резюме (или одно название, если резюме нет), чтобы документ находился по названию
+    session.execute(text(
+        f"INSERT INTO {TABLE} (title, body, document_id, page_number) "
+        "SELECT d.title, coalesce(d.summary, ''), d.id, :summary_page FROM document d WHERE d.id = :id"
+    ), params)
+
+
+def reindex_all(session, batch_size=500, progress=None):
+    """Перестраивает индекс по всем документам, фиксируя транзакцию каждые batch_size документов."""
+    session.execute(text(f'DELETE FROM {TABLE}'))
+    ids = [row[0] for row in session.execute(text('SELECT id FROM document ORDER BY id'))]
+    for number, document_id in enumerate(ids, start=1):
+        index_document(session, document_id)
+        if number % batch_size == 0:
+            session.commit()
+            if progress:
+                progress(number, len(ids))
+    session.execute(text(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')"))
+    session.commit()
+    return len(ids)
+
+
+def build_query(query):
+    """Запрос пользователя в синтаксисе FTS5: слова в кавычках через AND,
+    последнее слово ищется как префикс. Операторы FTS5 из ввода не передаются."""
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(session, query, limit=20, offset=0, title_weight=10.0, snippet_tokens=16):
+    """Документы по убыванию релевантности (BM25) и общее число найденных.
+
+    Для каждого документа берётся лучшая страница; сниппет с подсветкой
+    строится только для выбранной страницы результатов.
+    """
+    match = build_query(query)
+    if match is None:
+        return [], 0
+
+    total = session.execute(text(
+        f'SELECT count(DISTINCT document_id) FROM {TABLE} WHERE {TABLE} MATCH :match'
+    ), {'match': match}).scalar()
+    if not total:
+        return [], 0
+
+    best = session.execute(text(
+        "SELECT rowid, document_id, page_number, score FROM ("
+        "  SELECT rowid, document_id, page_number, score,"
+        "         row_number() OVER (PARTITION BY document_id ORDER BY score) AS position"
+        f"  FROM (SELECT rowid, document_id, page_number, bm25({TABLE}, :title_weight, 1.0) AS score"
+        f"        FROM {TABLE} WHERE {TABLE} MATCH :match)"
+        ") WHERE position = 1 ORDER BY score, document_id LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'title_weight': title_weight, 'limit': limit, 'offset': offset}).all()
+    if not best:
+        return [], total
+
+    rowids = ','.join(str(int(row.rowid)) for row in best)
+    snippets = dict(session.execute(text(
+        f"SELECT rowid, snippet({TABLE}, 1, :start, :end, '…', :tokens) FROM {TABLE} "
+        f"WHERE {TABLE} MATCH :match AND rowid IN ({rowids})"
+    ), {'match': match, 'start': _MARK_START, 'end': _MARK_END, 'tokens': snippet_tokens}).all())
+
+    results = [
+        {
+            'document_id': row.document_id,
+            'page_number': row.page_number,
+            'score': -row.score,  # bm25() в SQLite отрицательный: чем меньше, тем релевантнее
+            'snippet': _snippet_html(snippets.get(row.rowid, '')),
+        }
+        for row in best
+    ]
+    return results, total
+
+
+def _snippet_html(snippet):
+    return html.escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
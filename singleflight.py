@@ -0,0 +1,60 @@
+import fcntl
+import os
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одновременных вызовов с одинаковым ключом.
+
+    Внутри процесса первый вызов выполняет функцию, остальные ждут его
+    результата. Между процессами (воркеры gunicorn и `flask worker`) вызовы
+    упорядочиваются файловой блокировкой в lock_folder: функция должна сама
+    проверить, не сохранил ли результат процесс, державший блокировку раньше.
+    """
+
+    def __init__(self, lock_folder=None):
+        self.lock_folder = lock_folder
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_locked(key, func)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _run_locked(self, key, func):
+        if self.lock_folder is None:
+            return func()
+        os.makedirs(self.lock_folder, exist_ok=True)
+        with open(os.path.join(self.lock_folder, f'{key}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return func()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import time
+from collections import deque
+
+import metrics
+
+
+# Версия промптов входит в ключ кэша: после их изменения части пересуммируются
+PROMPT_VERSION = 1
+CHUNK_PROMPT = 'Сделай резюме для следующего фрагмента документа: {text}'
+REDUCE_PROMPT = 'Объедини резюме частей документа в одно связное резюме без повторов: {text}'
+SYSTEM_MESSAGE = 'You are a helpful assistant.'
+
+
+def estimate_tokens(text):
+    # Грубая оценка для кириллицы: около трёх символов на токен
+    return len(text) // 3 + 1
+
+
+def chunk_text(pages, max_tokens):
+    """Делит текст, переданный по страницам, на части не больше max_tokens токенов.
+
+    Границы частей проходят по абзацам, а слишком длинные абзацы режутся по словам.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append('\n'.join(current))
+        current = []
+        current_tokens = 0
+
+    for page in pages:
+        for paragraph in page.split('\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            tokens = estimate_tokens(paragraph)
+            if tokens > max_tokens:
+                flush()
+                words = []
+                words_tokens = 0
+                for word in paragraph.split():
+                    word_tokens = estimate_tokens(word)
+                    if words and words_tokens + word_tokens > max_tokens:
+                        chunks.append(' '.join(words))
+                        words = []
+                        words_tokens = 0
+                    words.append(word)
+                    words_tokens += word_tokens
+                if words:
+                    current = [' '.join(words)]
+                    current_tokens = words_tokens
+                continue
+            if current_tokens + tokens > max_tokens:
+                flush()
+            current.append(paragraph)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+
+class RateLimiter:
+    """Не больше max_calls вызовов за period секунд (скользящее окно)."""
+
+    def __init__(self, max_calls, period=60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.period:
+                    self.calls.popleft()
+                if len(self.calls) < self.max_calls:
+                    self.calls.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self.calls[0]))
+
+
+def openai_completion(model, api_key=None, max_tokens=500, temperature=0.7):
+    """Асинхронная функция вызова ChatCompletion для Summarizer.
+
+    Библиотека openai импортируется при первом запросе, а не при запуске.
+    """
+    async def complete(messages):
+        import openai
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            api_key=api_key,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response['choices'][0]['message']['content'].strip()
+    return complete
+
+
+class Summarizer:
+    """Резюме длинных документов по схеме map-reduce.
+
+    Текст делится на части, части суммируются параллельно (не больше
+    concurrency запросов одновременно и requests_per_minute в минуту), затем
+    резюме частей сводятся в одно, при необходимости в несколько уровней.
+    Резюме каждой части кэшируется по хэшу её текста, модели и версии промпта,
+    поэтому при повторном запуске запрашиваются только изменившиеся части.
+
+    complete — асинхронная функция, принимающая список сообщений и
+    возвращающая текст ответа; для тестов её можно заменить заглушкой.
+    """
+
+    def __init__(self, complete, model, cache=None, max_chunk_tokens=3000, concurrency=4,
+                 requests_per_minute=60, retries=3, retry_delay=2.0):
+        self.complete = complete
+        self.model = model
+        self.cache = cache
+        self.max_chunk_tokens = max_chunk_tokens
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def summarize(self, pages):
+        return asyncio.run(self.asummarize(pages))
+
+    def limits(self):
+        """Семафор и ограничитель запросов. Создаются внутри цикла событий, в котором
+        работают; несколько одновременных asummarize с общими limits() вместе
+        соблюдают concurrency и requests_per_minute."""
+        return asyncio.Semaphore(self.concurrency), RateLimiter(self.requests_per_minute)
+
+    async def asummarize(self, pages, limits=None):
+        semaphore, limiter = limits or self.limits()
+
+        summaries = chunk_text(pages, self.max_chunk_tokens)
+        if not summaries:
+            return ''
+        prompt = CHUNK_PROMPT
+        while True:
+            # Одинаковые части (повторяющиеся страницы) суммируются один раз
+            tasks = {}
+            for chunk in summaries:
+                key = self.cache_key(chunk, prompt)
+                if key not in tasks:
+                    tasks[key] = asyncio.ensure_future(self._summarize_chunk(chunk, prompt, semaphore, limiter))
+            summaries = await asyncio.gather(*(tasks[self.cache_key(chunk, prompt)] for chunk in summaries))
+            if len(summaries) == 1:
+                return summaries[0]
+            summaries = self._group(summaries)
+            prompt = REDUCE_PROMPT
+
+    def _group(self, summaries):
+        # В каждой группе не меньше двух резюме, чтобы их число на каждом уровне уменьшалось
+        groups = []
+        current = []
+        current_tokens = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if len(current) >= 2 and current_tokens + tokens > self.max_chunk_tokens:
+                groups.append('\n\n'.join(current))
+                current = []
+                current_tokens = 0
+            current.append(summary)
+            current_tokens += tokens
+        if len(current) == 1 and groups:
+            groups[-1] += '\n\n' + current[0]
+        elif current:
+            groups.append('\n\n'.join(current))
+        return groups
+
+    def cache_key(self, chunk, prompt):
+        source = f'{PROMPT_VERSION}\0{self.model}\0{prompt}\0{chunk}'
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    async def _summarize_chunk(self, chunk, prompt, semaphore, limiter):
+        key = self.cache_key(chunk, prompt)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        messages = [
+            {'role': 'system', 'content': SYSTEM_MESSAGE},
+            {'role': 'user', 'content': prompt.format(text=chunk)},
+        ]
+        async with semaphore:
+            for attempt in range(1, self.retries + 1):
+                await limiter.acquire()
+                try:
+                    with metrics.stage('llm'):
+                        summary = await self.complete(messages)
+                    break
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+                    await asyncio.sleep(self.retry_delay * attempt)
+
+        if self.cache is not None:
+            self.cache.put(key, summary)
+        return summary
@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+import date_extract
+from date_extract import DAY, MONTH, YEAR
+
+
+@pytest.mark.parametrize('text, value, precision', [
+    ('Договор от 2023-03-12.', date(2023, 3, 12), DAY),
+    ('Договор от 12.03.2023.', date(2023, 3, 12), DAY),
+    ('Договор от 12/03/2023', date(2023, 3, 12), DAY),
+    ('Договор от 1-3-2023', date(2023, 3, 1), DAY),
+    ('Подписан 12 марта 2023 г.', date(2023, 3, 12), DAY),
+    ('Подписан 1 мая 2020 года', date(2020, 5, 1), DAY),
+    ('Отчёт за 03.2023', date(2023, 3, 1), MONTH),
+    ('Отчёт за 11/2022 г.', date(2022, 11, 1), MONTH),
+    ('Период 01-2024', date(2024, 1, 1), MONTH),
+    ('Отчёт за март 2023 года', date(2023, 3, 1), MONTH),
+    ('Собрание в мае 2021 г.', date(2021, 5, 1), MONTH),
+    ('Итоги 2019 года', date(2019, 1, 1), YEAR),
+    ('План на 2024 г.', date(2024, 1, 1), YEAR),
+])
+def test_formats(text, value, precision):
+    found = date_extract.extract_dates(text)
+    assert [(item.value, item.precision) for item in found] == [(value, precision)]
+    assert text[found[0].start:found[0].end] == found[0].text
+
+
+@pytest.mark.parametrize('text', [
+    '31.02.2023',         # Нет такого дня
+    '12.13.2023',         # Нет такого месяца
+    '13.2023',            # Нет такого месяца
+    '3.2023',             # Месяц без ведущего нуля — скорее число, чем дата
+    '12.03.1850',         # Год вне диапазона
+    'Артикул 2023',       # Год без указателя
+    'Версия 1.12.03.2023',
+    'Телефон 12-03-2023-45',
+])
+def test_rejected(text):
+    assert date_extract.extract_dates(text) == []
+
+
+def test_long_format_wins_over_month_year():
+    found = date_extract.extract_dates('12 марта 2023 г.')
+    assert len(found) == 1 and found[0].precision == DAY
+
+
+def test_leap_year():
+    assert date_extract.extract_dates('29.02.2024')[0].value == date(2024, 2, 29)
+    assert date_extract.extract_dates('29.02.2023') == []
+
+
+def test_page_numbers():
+    pages = ['Без дат.', 'С 01.01.2020 по 31.12.2020.']
+    assert [(number, found.value) for number, found in date_extract.iter_page_dates(pages)] == [
+        (2, date(2020, 1, 1)), (2, date(2020, 12, 31)),
+    ]
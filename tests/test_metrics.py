@@ -0,0 +1,24 @@
+import threading
+import time
+
+import metrics
+
+
+def test_stage_decorator_times_concurrent_calls_separately():
+    registry = metrics.Registry()
+    histogram = registry.histogram('test_seconds', 'Тест.', ['stage'])
+
+    @histogram.time('work')
+    def work(seconds):
+        time.sleep(seconds)
+
+    threads = [threading.Thread(target=work, args=(0.3,)), threading.Thread(target=work, args=(0.4,))]
+    threads[0].start()
+    time.sleep(0.1)
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    total, count = histogram.values[('work',)][-2:]
+    assert count == 2
+    assert total >= 0.7
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+import word_diff
+
+
+def assert_valid_opcodes(opcodes, tokens1, tokens2):
+    """Опкоды непрерывно покрывают оба текста, а участки equal действительно совпадают."""
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        assert i1 <= i2 and j1 <= j2
+        if tag == 'equal':
+            assert i2 - i1 == j2 - j1 > 0
+            assert tokens1[i1:i2] == tokens2[j1:j2]
+        elif tag == 'replace':
+            assert i2 > i1 and j2 > j1
+        elif tag == 'delete':
+            assert i2 > i1 and j2 == j1
+        else:
+            assert tag == 'insert' and i2 == i1 and j2 > j1
+        i, j = i2, j2
+    assert (i, j) == (len(tokens1), len(tokens2))
+
+
+def random_tokens(rng, size, vocabulary):
+    return [f'w{rng.randrange(vocabulary)}' for _ in range(size)]
+
+
+def mutate(rng, tokens, vocabulary, changes):
+    tokens = list(tokens)
+    for _ in range(changes):
+        position = rng.randrange(len(tokens) + 1)
+        action = rng.choice(('insert', 'delete', 'replace'))
+        if action == 'insert' or not tokens or position == len(tokens):
+            tokens.insert(position, f'w{rng.randrange(vocabulary)}')
+        elif action == 'delete':
+            del tokens[position]
+        else:
+            tokens[position] = f'w{rng.randrange(vocabulary)}'
+    return tokens
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('vocabulary', [3, 50, 5000])
+def test_opcodes_are_valid(seed, vocabulary):
+    rng = random.Random(seed)
+    tokens1 = random_tokens(rng, rng.randrange(0, 400), vocabulary)
+    tokens2 = mutate(rng, tokens1, vocabulary, rng.randrange(0, 40))
+    # Маленький cutoff, чтобы участки делились и через _rare_anchor, и через ограниченный Майерс
+    for cutoff in (8, 2000):
+        assert_valid_opcodes(word_diff.diff_opcodes(tokens1, tokens2, cutoff), tokens1, tokens2)
+
+
+@pytest.mark.parametrize('tokens1, tokens2', [
+    ([], []),
+    ([], ['a', 'b']),
+    (['a', 'b'], []),
+    (['a', 'b', 'c'], ['a', 'b', 'c']),
+    (['a', 'b', 'c'], ['x', 'y', 'z']),
+])
+def test_opcodes_edge_cases(tokens1, tokens2):
+    assert_valid_opcodes(word_diff.diff_opcodes(tokens1, tokens2), tokens1, tokens2)
+
+
+def test_identical_texts_are_one_equal_opcode():
+    tokens = 'один два три два один'.split()
+    assert word_diff.diff_opcodes(tokens, tokens) == [('equal', 0, 5, 0, 5)]
+
+
+def test_rare_anchor_prefers_longer_match():
+    # 'u' уникально, но совпадает одним словом; 'r' встречается дважды, зато начинает отрезок из пяти слов
+    a = ['u', 'r', 'x1', 'x2', 'x3', 'x4', 'r', 'y']
+    b = ['r', 'x1', 'x2', 'x3', 'x4', 'z', 'u', 'q']
+    assert word_diff._rare_anchor(a, 0, len(a), b, 0, len(b)) == (1, 0, 5)
+
+
+def test_rare_anchor_prefers_rarer_word_for_equal_length():
+    a = ['c', 'c', 'c', 'u', 'c']
+    b = ['u', 'c']
+    assert word_diff._rare_anchor(a, 0, len(a), b, 0, len(b)) == (3, 0, 2)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pack_and_invert_round_trip(seed):
+    rng = random.Random(seed)
+    tokens1 = random_tokens(rng, 300, 40)
+    tokens2 = mutate(rng, tokens1, 40, 30)
+    opcodes = word_diff.diff_opcodes(tokens1, tokens2)
+
+    assert word_diff.unpack_opcodes(word_diff.pack_opcodes(opcodes)) == opcodes
+    assert word_diff.invert_opcodes(word_diff.invert_opcodes(opcodes)) == opcodes
+    # Обращённые опкоды — корректное сравнение второго текста с первым
+    assert_valid_opcodes(word_diff.invert_opcodes(opcodes), tokens2, tokens1)
+
+
+def test_split_hunks_covers_all_opcodes():
+    rng = random.Random(1)
+    tokens1 = random_tokens(rng, 2000, 300)
+    tokens2 = mutate(rng, tokens1, 300, 100)
+    opcodes = word_diff.diff_opcodes(tokens1, tokens2)
+    hunks = word_diff.split_hunks(opcodes, max_tokens=50)
+    assert_valid_opcodes([opcode for hunk in hunks for opcode in hunk], tokens1, tokens2)
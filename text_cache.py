@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+
+
+# Размер блока при чтении файла для вычисления хэша
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extractor_version():
+    # Версия PyPDF2 входит в ключ: после обновления библиотеки текст извлекается заново
+    from PyPDF2 import __version__
+    return __version__
+
+
+class TextCache:
+    """Дисковый кэш текстов, адресуемый по содержимому.
+
+    Каждая запись хранится отдельным файлом <key>.txt. Время модификации файла
+    служит отметкой последнего обращения, по нему вытесняются самые старые
+    записи, когда суммарный размер превышает max_bytes.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(self.folder, f'{key}.txt')
+
+    def key_for_file(self, file_path):
+        return f'{file_sha256(file_path)}-{extractor_version()}'
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as file:
+                text = file.read()
+            os.utime(path)  # Отмечаем обращение для LRU
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(tmp_path, path)  # Атомарная запись: читатели не увидят половину файла
+        with self._lock:
+            if self._size is not None:
+                self._size += os.path.getsize(path)
+            self._evict()
+
+    def get_or_extract(self, file_path, extract):
+        try:
+            key = self.key_for_file(file_path)
+        except OSError:
+            # Файла нет или он не читается: ошибку сообщит сама функция извлечения
+            return extract(file_path)
+        text = self.get(key)
+        if text is None:
+            text = extract(file_path)
+            if text:  # Пустой результат означает ошибку извлечения, его не кэшируем
+                self.put(key, text)
+        return text
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size_bytes': self._current_size(),
+                'max_bytes': self.max_bytes,
+            }
+
+    def _entries(self):
+        try:
+            with os.scandir(self.folder) as it:
+                return [entry for entry in it if entry.is_file() and entry.name.endswith('.txt')]
+        except FileNotFoundError:
+            return []
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+        return self._size
+
+    def _evict(self):
+        if self._current_size() <= self.max_bytes:
+            return
+        # Размер пересчитываем по диску: в каталог пишут и другие процессы gunicorn
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                entry_size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
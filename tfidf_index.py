@@ -0,0 +1,197 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+
+import minhash
+
+# scipy и sklearn импортируются при первом использовании: процессам, которым
+# индекс не нужен (вход, реестр), не приходится тратить на них время запуска.
+
+
+class CorpusIndex:
+    """Словарь и IDF, обученные на всём корпусе документов.
+
+    Состояние хранится в одном файле. Каждый процесс перечитывает его, когда
+    файл меняется, поэтому переобучение в фоновой задаче подхватывают и
+    процессы gunicorn. Версия растёт при каждом обучении: векторы документов,
+    посчитанные для старой версии, с новыми несравнимы.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vectorizer = None
+        self.version = 0
+        self.fitted_documents = 0  # Размер корпуса на момент обучения
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return self
+        if mtime != self._mtime:
+            with self._lock, open(self.path, 'rb') as file:
+                state = pickle.load(file)
+                self.vectorizer = state['vectorizer']
+                self.version = state['version']
+                self.fitted_documents = state['fitted_documents']
+                self._mtime = mtime
+        return self
+
+    @property
+    def fitted(self):
+        return self.refresh().vectorizer is not None
+
+    @property
+    def n_features(self):
+        return len(self.refresh().vectorizer.vocabulary_)
+
+    def fit(self, texts):
+        # Нормализация выключена: векторы страниц складываются, а нормируется сумма
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(norm=None)
+        counter = [0]
+
+        def counted():
+            for text in texts:
+                counter[0] += 1
+                yield text
+
+        vectorizer.fit(counted())
+        if hasattr(vectorizer, 'stop_words_'):
+            vectorizer.stop_words_ = None  # Отброшенные термины не нужны и раздувают файл
+
+        state = {
+            'vectorizer': vectorizer,
+            'version': self.refresh().version + 1,
+            'fitted_documents': counter[0],
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.refresh()
+
+    def transform(self, pages, batch_size=50):
+        """Нормированный TF-IDF вектор документа, переданного по страницам."""
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        vectorizer = self.refresh().vectorizer
+        vector = sparse.csr_matrix((1, len(vectorizer.vocabulary_)), dtype=np.float64)
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) == batch_size:
+                vector = vector + _sum_rows(vectorizer.transform(batch))
+                batch = []
+        if batch:
+            vector = vector + _sum_rows(vectorizer.transform(batch))
+        return normalize(vector)
+
+
+def _sum_rows(matrix):
+    from scipy import sparse
+    return sparse.csr_matrix(np.ones((1, matrix.shape[0]))) @ matrix
+
+
+def serialize_vector(vector):
+    from scipy import sparse
+    vector = sparse.csr_matrix(vector)
+    vector.sort_indices()
+    return vector.indices.astype(np.int32).tobytes() + vector.data.astype(np.float32).tobytes()
+
+
+def deserialize_vector(blob, n_features):
+    return stack_vectors([blob], n_features)
+
+
+def stack_vectors(blobs, n_features):
+    # Склейка сохранённых векторов в одну CSR-матрицу без промежуточных копий строк
+    from scipy import sparse
+    indptr = [0]
+    indices = []
+    data = []
+    for blob in blobs:
+        count = len(blob) // 8
+        indices.append(np.frombuffer(blob, dtype=np.int32, count=count))
+        data.append(np.frombuffer(blob, dtype=np.float32, offset=4 * count))
+        indptr.append(indptr[-1] + count)
+    return sparse.csr_matrix(
+        (
+            np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+            np.array(indptr),
+        ),
+        shape=(len(blobs), n_features),
+    )
+
+
+def cosine(vector1, vector2):
+    # Векторы нормированы, поэтому косинус — просто скалярное произведение
+    return float(vector1.multiply(vector2).sum())
+
+
+def max_similarities(matrix, block_size=1000):
+    """Для каждой строки — наибольшая схожесть с любой другой строкой."""
+    result = np.zeros(matrix.shape[0])
+    transposed = matrix.T.tocsc()
+    for start in range(0, matrix.shape[0], block_size):
+        block = (matrix[start:start + block_size] @ transposed).tocoo()
+        rows = block.row + start
+        others = rows != block.col
+        np.maximum.at(result, rows[others], block.data[others])
+    return result
+
+
+class NeighbourIndex:
+    """Матрица векторов всего корпуса для поиска ближайших документов.
+
+    Для больших корпусов (от lsh_min_documents) строится LSH по MinHash-сигнатурам
+    множеств терминов: скалярные произведения считаются только с кандидатами,
+    совпавшими хотя бы в одной полосе.
+    """
+
+    def __init__(self, ids, matrix, lsh_min_documents=None, num_perm=128, bands=32):
+        self.ids = np.asarray(ids)
+        self.matrix = matrix
+        self.positions = {document_id: row for row, document_id in enumerate(ids)}
+        self.lsh = None
+        self.signatures = None
+        if lsh_min_documents is not None and len(ids) >= lsh_min_documents:
+            hasher = minhash.MinHasher(num_perm)
+            self.lsh = minhash.LSHIndex(num_perm, bands)
+            self.signatures = []
+            for row, document_id in enumerate(ids):
+                terms = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+                signature = hasher.signature(terms)
+                self.signatures.append(signature)
+                self.lsh.add(document_id, signature)
+
+    def top_k(self, document_id, k):
+        """Пары (id документа, схожесть) для k ближайших документов."""
+        row = self.positions[document_id]
+        vector = self.matrix[row].T
+        rows = None
+        if self.lsh is not None:
+            candidates = self.lsh.query(self.signatures[row])
+            candidates.discard(document_id)
+            # Если кандидатов меньше k, честно просматриваем весь корпус
+            if len(candidates) >= k:
+                rows = np.fromiter((self.positions[c] for c in candidates), dtype=np.int64)
+        if rows is None:
+            scores = (self.matrix @ vector).toarray().ravel()
+            rows = np.flatnonzero(np.arange(len(self.ids)) != row)
+            scores = scores[rows]
+        else:
+            scores = (self.matrix[rows] @ vector).toarray().ravel()
+        if not len(rows):
+            return []
+
+        k = min(k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in best]
@@ -0,0 +1,334 @@
+from array import array
+from bisect import bisect_left
+from html import escape
+
+
+def tokenize(text):
+    return text.split()
+
+
+def intern_tokens(tokens1, tokens2):
+    """Заменяет слова целыми номерами: дальше сравниваются числа, а не строки."""
+    ids = {}
+    arrays = []
+    for tokens in (tokens1, tokens2):
+        arrays.append(array('i', (ids.setdefault(token, len(ids)) for token in tokens)))
+    return arrays[0], arrays[1]
+
+
+def diff_opcodes(tokens1, tokens2, cutoff=2000):
+    """Опкоды в формате difflib.SequenceMatcher.get_opcodes() для двух списков слов.
+
+    Общие начало и конец отбрасываются, затем участки разбиваются по словам,
+    встречающимся ровно один раз в обоих текстах (patience diff). Промежутки
+    без таких слов длиннее cutoff слов делятся по общему отрезку, который
+    начинается с редкого слова (как histogram diff в git), а короткие сравниваются точным алгоритмом
+    Майерса. Если редких слов нет (текст из одних повторов), длинный участок
+    тоже сравнивается Майерсом, но не более чем с cutoff правками, иначе он
+    целиком считается заменой. Так сравнение остаётся почти линейным.
+    """
+    a, b = intern_tokens(tokens1, tokens2)
+    matches = []
+    _match_ranges(a, b, cutoff, matches)
+
+    opcodes = []
+    i = j = 0
+    for match_i, match_j, size in matches + [(len(a), len(b), 0)]:
+        if i < match_i and j < match_j:
+            opcodes.append(('replace', i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(('delete', i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(('insert', i, i, j, match_j))
+        if size:
+            opcodes.append(('equal', match_i, match_i + size, match_j, match_j + size))
+        i, j = match_i + size, match_j + size
+    return opcodes
+
+
+def _match_ranges(a, b, cutoff, matches):
+    # Явный стек вместо рекурсии. В нём лежат участки для сравнения и уже найденные
+    # совпадения (якоря, общие концы), которые нужно вывести после участков левее.
+    stack = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'match':
+            _add_match(matches, *item[1:])
+            continue
+        _, alo, ahi, blo, bhi = item
+
+        # Общее начало и общий конец
+        prefix = 0
+        while alo + prefix < ahi and blo + prefix < bhi and a[alo + prefix] == b[blo + prefix]:
+            prefix += 1
+        if prefix:
+            _add_match(matches, alo, blo, prefix)
+            alo += prefix
+            blo += prefix
+        suffix = 0
+        while alo < ahi - suffix and blo < bhi - suffix and a[ahi - suffix - 1] == b[bhi - suffix - 1]:
+            suffix += 1
+        if suffix:
+            ahi -= suffix
+            bhi -= suffix
+            stack.append(('match', ahi, bhi, suffix))
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            segments = []
+            i, j = alo, blo
+            for anchor_i, anchor_j in anchors:
+                segments.append(('range', i, anchor_i, j, anchor_j))
+                segments.append(('match', anchor_i, anchor_j, 1))
+                i, j = anchor_i + 1, anchor_j + 1
+            segments.append(('range', i, ahi, j, bhi))
+            stack.extend(reversed(segments))
+            continue
+
+        if (ahi - alo) + (bhi - blo) <= cutoff:
+            for match in _myers(a, alo, ahi, b, blo, bhi):
+                _add_match(matches, *match)
+            continue
+
+        anchor = _rare_anchor(a, alo, ahi, b, blo, bhi)
+        if anchor is not None:
+            i, j, size = anchor
+            stack.append(('range', i + size, ahi, j + size, bhi))
+            stack.append(('match', i, j, size))
+            stack.append(('range', alo, i, blo, j))
+            continue
+
+        for match in _myers(a, alo, ahi, b, blo, bhi, max_edits=cutoff) or ():
+            _add_match(matches, *match)
+
+
+def _add_match(matches, i, j, size):
+    if matches:
+        last_i, last_j, last_size = matches[-1]
+        if last_i + last_size == i and last_j + last_size == j:
+            matches[-1] = (last_i, last_j, last_size + size)
+            return
+    matches.append((i, j, size))
+
+
+def _unique_anchors(a, alo, ahi, b, blo, bhi):
+    """Слова, единственные в обоих участках, образующие самую длинную общую последовательность."""
+    first = {}  # Слово -> позиция в первом участке или None, если слово повторяется
+    for i in range(alo, ahi):
+        token = a[i]
+        first[token] = None if token in first else i
+    second = {}
+    for j in range(blo, bhi):
+        token = b[j]
+        if first.get(token) is not None:
+            second[token] = None if token in second else j
+    pairs = sorted((first[token], j) for token, j in second.items() if j is not None)
+    if not pairs:
+        return []
+
+    # Наибольшая возрастающая подпоследовательность по позициям во втором тексте (patience sorting)
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+        previous[index] = tail_indexes[position - 1] if position else None
+    result = []
+    index = tail_indexes[-1]
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+def _rare_anchor(a, alo, ahi, b, blo, bhi, max_occurrences=64):
+    """Общий отрезок для разбиения участка: длинный и начинающийся с редкого слова.
+
+    Отрезки сравниваются по длине, делённой на число вхождений первого слова в
+    первом участке: уникальное слово с совпадением в одно слово не перевешивает
+    длинное совпадение со словом, которое встречается чуть чаще.
+    """
+    positions = {}
+    for i in range(alo, ahi):
+        positions.setdefault(a[i], []).append(i)
+    best = None
+    best_score = 0.0
+    j = blo
+    while j < bhi:
+        candidates = positions.get(b[j])
+        # Даже совпадение до конца участка не даст лучшей оценки — слово не проверяем
+        if candidates is None or len(candidates) > max_occurrences or (bhi - j) / len(candidates) <= best_score:
+            j += 1
+            continue
+        longest = 1
+        for i in candidates:
+            size = 1
+            while i + size < ahi and j + size < bhi and a[i + size] == b[j + size]:
+                size += 1
+            if size / len(candidates) > best_score:
+                best = (i, j, size)
+                best_score = size / len(candidates)
+            longest = max(longest, size)
+        j += longest  # Внутри найденного отрезка новых кандидатов не ищем
+    return best
+
+
+def _myers(a, alo, ahi, b, blo, bhi, max_edits=None):
+    """Совпадающие отрезки (i, j, длина) по алгоритму Майерса; None, если правок больше max_edits."""
+    n = ahi - alo
+    m = bhi - blo
+    limit = n + m if max_edits is None else min(n + m, max_edits)
+    v = array('i', [0]) * (2 * limit + 3)
+    offset = limit + 1
+    trace = []
+    for d in range(limit + 1):
+        # Сохраняем только нужную часть фронта: диагонали от -d-1 до d+1
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, alo, blo)
+    return None
+
+
+def _backtrack(trace, n, m, alo, blo):
+    matches = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        base = d + 1  # Смещение диагонали 0 в сохранённом срезе
+        k = x - y
+        if k == -d or (k != d and v[base + k - 1] < v[base + k + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[base + previous_k]
+        previous_y = previous_x - previous_k
+        size = 0
+        while x > previous_x and y > previous_y and x > 0 and y > 0:
+            x -= 1
+            y -= 1
+            size += 1
+        if size:
+            matches.append((alo + x, blo + y, size))
+        x, y = previous_x, previous_y
+    matches.reverse()
+    return matches
+
+
+def iter_highlighted_html(tokens, opcodes, side, chunk_tokens=2000):
+    """HTML одной стороны сравнения по частям: общие слова обёрнуты в <span class='highlight'>.
+
+    side — 0 для первого текста и 1 для второго. Части отдаются по мере
+    накопления примерно chunk_tokens слов, чтобы ответ можно было отправлять
+    потоком, не собирая всю страницу в памяти.
+    """
+    parts = []
+    pending = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        start, stop = (i1, i2) if side == 0 else (j1, j2)
+        if start == stop:
+            continue
+        text = escape(' '.join(tokens[start:stop]))
+        parts.append(f"<span class='highlight'>{text}</span>" if tag == 'equal' else text)
+        pending += stop - start
+        if pending >= chunk_tokens:
+            yield ' '.join(parts) + ' '
+            parts = []
+            pending = 0
+    if parts:
+        yield ' '.join(parts)
+
+
+def highlight(tokens1, tokens2, opcodes):
+    return (
+        ''.join(iter_highlighted_html(tokens1, opcodes, 0)),
+        ''.join(iter_highlighted_html(tokens2, opcodes, 1)),
+    )
+
+
+def split_hunks(opcodes, max_tokens=300):
+    """Делит опкоды на выровненные фрагменты для показа двух текстов рядом.
+
+    Каждый фрагмент — список опкодов, поэтому обе его стороны начинаются и
+    заканчиваются на общей границе. Опкоды длиннее max_tokens слов режутся на
+    части, фрагмент закрывается, как только в нём набирается max_tokens слов.
+    """
+    hunks = []
+    current = []
+    size = 0
+    for opcode in _split_long_opcodes(opcodes, max_tokens):
+        tag, i1, i2, j1, j2 = opcode
+        current.append(opcode)
+        size += max(i2 - i1, j2 - j1)
+        if size >= max_tokens:
+            hunks.append(current)
+            current = []
+            size = 0
+    if current:
+        hunks.append(current)
+    return hunks
+
+
+def _split_long_opcodes(opcodes, max_tokens):
+    for tag, i1, i2, j1, j2 in opcodes:
+        while i1 < i2 or j1 < j2:
+            stop_i = min(i2, i1 + max_tokens)
+            stop_j = min(j2, j1 + max_tokens)
+            if tag != 'equal':  # Часть замены может остаться только с одной стороны
+                tag = 'replace' if stop_i > i1 and stop_j > j1 else ('delete' if stop_i > i1 else 'insert')
+            yield tag, i1, stop_i, j1, stop_j
+            i1, j1 = stop_i, stop_j
+
+
+def render_hunk(tokens1, tokens2, hunk):
+    """HTML обеих сторон фрагмента из split_hunks."""
+    return {
+        'left': ''.join(iter_highlighted_html(tokens1, hunk, 0)),
+        'right': ''.join(iter_highlighted_html(tokens2, hunk, 1)),
+        'changed': any(tag != 'equal' for tag, *_ in hunk),
+    }
+
+
+# Упаковка опкодов в массив целых чисел для хранения в базе
+TAG_CODES = {'equal': 0, 'replace': 1, 'delete': 2, 'insert': 3}
+CODE_TAGS = {code: tag for tag, code in TAG_CODES.items()}
+INVERTED_TAGS = {'equal': 'equal', 'replace': 'replace', 'delete': 'insert', 'insert': 'delete'}
+
+
+def pack_opcodes(opcodes):
+    packed = array('i')
+    for tag, i1, i2, j1, j2 in opcodes:
+        packed.extend((TAG_CODES[tag], i1, i2, j1, j2))
+    return packed.tobytes()
+
+
+def unpack_opcodes(blob):
+    packed = array('i')
+    packed.frombytes(blob)
+    return [
+        (CODE_TAGS[packed[index]], *packed[index + 1:index + 5])
+        for index in range(0, len(packed), 5)
+    ]
+
+
+def invert_opcodes(opcodes):
+    """Опкоды сравнения второго текста с первым."""
+    return [(INVERTED_TAGS[tag], j1, j2, i1, i2) for tag, i1, i2, j1, j2 in opcodes]